@@ -1,9 +1,17 @@
+import os
 import time
 import math
+import queue
+import threading
+import multiprocessing as mp
 from collections import deque, defaultdict, Counter
 from dataclasses import dataclass
 from typing import List, Dict
-from syscall_helpers import SysType
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from syscall_helpers import SysType, SYSTYPES, syscall_name, SYSCALL_TABLE, SIGNATURES, max_syscalls
+from batch_queue import BatchQueue
+from profile_store import profile_path, read_profile, write_profile
 from enum import Enum
 
 """
@@ -20,6 +28,33 @@ sequence_prob = 0.001 # sequences rare than this are suspicious
 param_z_thresh = 5.0 # parameters have to be super far from normal cuz theyre not a good tell
 seq_severity_min = 0.6 #only report strong seq anomalys
 min_std_dev = 0.1 # set a minimum to avoid setting it too low and having tons of false positives
+freq_window = 60 # seconds of per category rates FrequencyDetector remembers
+param_window = 100 # values per fd/size key ParameterDetector remembers
+
+size_keys = ("size", "length", "count", "len") # arg names ParameterDetector treats as sizes
+param_keys = ("fd",) + size_keys # syscalls without any of these never need their args parsed for detection
+param_chunk = 4096 # batch parameter checks run this many events at a time (bounds the sliding window copies)
+seq_table_bits = 14 # hashed transition slots per pid (2^14 uint32s = 64kb), fixed no matter how weird the process gets
+seq_count_cap = 1 << 30 # halve the transition counts past this so they never overflow and old habits fade
+
+
+def _build_arg_index():
+    """
+    for each param key, which of the 6 raw args holds it per syscall id (-1 = that syscall doesnt have it)
+    lets the batch path pull a whole column out of the raw args without parsing anything
+    """
+    idx = {k: np.full(max_syscalls, -1, dtype=np.int8) for k in param_keys}
+    for sid, name in SYSCALL_TABLE.items():
+        if not 0 <= sid < max_syscalls:
+            continue
+        for i, arg in enumerate((SIGNATURES.get(name) or [])[:6]):
+            if arg in idx:
+                idx[arg][sid] = i
+    return idx
+
+
+ARG_INDEX = _build_arg_index()
+ARG_COLUMNS = np.stack([ARG_INDEX[k] for k in param_keys]) #same thing as one (key, syscall id) table for the batch path
 
 
 @dataclass
@@ -38,41 +73,83 @@ class RollingStats:
     keeps a rolling window of values
     used to learn what is the normal amount of weird activity
     and waht to flag
+
+    mean and variance are kept up to date on every add (welford, with the value
+    falling out of the window swapped for the new one) so mean/std/z are o(1)
+    instead of looping the whole window each call
+    rounding drift is wiped by recomputing from the window once per full window of evictions
+    (or straight away when an outlier leaves and the variance collapses)
+    the running mean is kept relative to a shift (the mean as of the last recompute), a mean up
+    near 2^53 rounds by a whole unit every step and that eats a small spread alive otherwise
     """
 
     def __init__(self, window_size=100):
         # deque auto drops old values when full
         self.window = deque(maxlen=window_size)
+        self._shift = 0.0
+        self._mean = 0.0 # relative to _shift
+        self._m2 = 0.0 # sum of squared distances from the mean
+        self._evictions = 0
 
     def add(self, value):
-        self.window.append(value)
+        value = float(value)
+        n = len(self.window)
+        if not n:
+            self._shift = value
+        x = value - self._shift
+
+        if n == self.window.maxlen: #full, swap oldest for newest (n stays the same)
+            old = self.window[0] - self._shift
+            self.window.append(value)
+            delta = x - old
+            new_mean = self._mean + delta / n
+            prev_m2 = self._m2
+            self._m2 += delta * (x - new_mean + old - self._mean)
+            self._mean = new_mean
+
+            self._evictions += 1
+            if self._evictions >= n or self._m2 < prev_m2 * 0.5:
+                #variance collapsing means an outlier just left, that subtraction loses most of its precision
+                self._recompute()
+        else:
+            self.window.append(value)
+            delta = x - self._mean
+            self._mean += delta / (n + 1)
+            self._m2 += delta * (x - self._mean)
+
+    def _recompute(self):
+        #exact two pass over the window, amortized o(1) since it runs once per window_size adds
+        n = len(self.window)
+        self._shift = math.fsum(self.window) / n if n else 0.0
+        dev = np.fromiter(self.window, float, n) - self._shift
+        self._mean = math.fsum(dev.tolist()) / n if n else 0.0 #what rounding the shift left over
+        dev -= self._mean
+        self._m2 = math.fsum((dev * dev).tolist())
+        self._evictions = 0
+
+    def extend(self, values):
+        """bulk add (batch path), one exact recompute instead of a welford step per value"""
+        self.window.extend(values[-self.window.maxlen:].tolist()) #only the tail survives the window anyway
+        self._recompute()
 
     def mean(self):
         # average of current window
         if not self.window:
             return 0.0
-        return sum(self.window) / len(self.window)
+        return self._shift + self._mean
 
     def std_dev(self):
         # how much values normally wiggle around the mean
         if len(self.window) < 2:
             return 0.0
-
-        avg = self.mean()
-        total = 0.0
-
-        for x in self.window:
-            diff = x - avg
-            total += diff * diff
-
-        return math.sqrt(total / len(self.window))
+        return math.sqrt(max(self._m2, 0.0) / len(self.window))
 
     def z_score(self, value):
         # how far value is from normal relative to usual noise
         std = self.std_dev()
         if std == 0:
             return 0.0
-        return abs(value - self.mean()) / std
+        return abs(value - self._shift - self._mean) / std
 
     def is_ready(self):
         # dont trust stats until enough samples exist
@@ -86,18 +163,24 @@ class FrequencyDetector:
     uses the rollingstats class to identify wahts a normal frequency
     and whats weird
     """
-    def __init__(self):
+    def __init__(self, now: float = None):
         self.category_rates = {} # keep zscore for each category
         self.last_counts = defaultdict(int) #raw counts since last tick
-        self.last_check_time = time.time()
+        self.last_check_time = time.time() if now is None else now
+        self.counted_until = None #read time of the last kernel counts added, ticks then go from read to read
 
-    def add_syscall(self, category: SysType):
-        self.last_counts[category] += 1 #count syscall occurences
+    def add_syscall(self, category: SysType, n: int = 1):
+        self.last_counts[category] += n #count syscall occurences (n > 1 when counts come pre aggregated from the kernel)
 
-    def check_and_update(self) -> List[Anomaly]:
-        now = time.time() # run once per sec
+    def check_and_update(self, now: float = None) -> List[Anomaly]:
+        now = time.time() if now is None else now # run once per sec
+        if self.counted_until is not None: #kernel counts, the interval is between the reads they came from
+            now = self.counted_until
         elapsed = now - self.last_check_time
 
+        if elapsed < 0: #clock went back (a looped replay starting over), new interval from here
+            self.last_check_time = now
+            return []
         if elapsed < 1.0:
             return []
 
@@ -105,7 +188,7 @@ class FrequencyDetector:
 
         for category, count in self.last_counts.items():
             if category not in self.category_rates: #initialize rolling state
-                self.category_rates[category] = RollingStats(window_size=60)
+                self.category_rates[category] = RollingStats(window_size=freq_window)
                 
             stats = self.category_rates[category]
             rate = count / elapsed
@@ -141,7 +224,7 @@ class ParameterDetector:
     file descriptor values sizes lengths etc
     """
     def __init__(self):
-        self.fd_stats = RollingStats(window_size=100)
+        self.fd_stats = RollingStats(window_size=param_window)
         self.size_stats = {}
 
     def analyze_args(self, syscall_name: str, args: dict) -> List[Anomaly]:
@@ -174,14 +257,14 @@ class ParameterDetector:
                     ))
 
         #size params
-        for key in ("size", "length", "count", "len"):
+        for key in size_keys:
             val = args.get(key)
             if not isinstance(val, (int,float)) or val <= 0:
                 continue
 
             stats = self.size_stats.get(key)
             if stats is None:
-                stats = RollingStats(window_size=100)
+                stats = RollingStats(window_size=param_window)
                 self.size_stats[key]=stats
 
             if stats.is_ready(): #enough data
@@ -199,27 +282,351 @@ class ParameterDetector:
 
         return out
 
+    def analyze_batch(self, ids, args, now: float = None) -> List[Anomaly]:
+        """
+        same checks as analyze_args over a whole batch at once
+        ids: syscall ids, args: matching (n, 6) raw arg rows, now: anomaly timestamp (default wall time)
+        every param key is a column pulled out with ARG_COLUMNS, each keys values go through
+        _sequential_z, then each keys window is extended in bulk
+        anomalies come out in the same order the per event path would give them
+        """
+        found = [] #(event index, key order, anomaly)
+        now = time.time() if now is None else now
+
+        for lo in range(0, len(ids), param_chunk):
+            #np.take, plain fancy indexing is a few times slower for these
+            col = np.take(ARG_COLUMNS, ids[lo:lo + param_chunk].astype(np.intp), axis=1) #(key, event) -> arg, -1 = none
+            n = col.shape[1]
+            at = np.flatnonzero(col >= 0) #key major, so each keys values come out back to back in event order
+            key_of = at // n
+            rows = at - key_of * n
+            raw = np.take(args[lo:lo + n].ravel(), rows * args.shape[1] + np.take(col, at))
+            valid = raw > 0 #same as the per event path, zero never counts
+            if not valid.all():
+                key_of, rows, raw = key_of[valid], rows[valid], raw[valid]
+            if not len(raw):
+                continue
+            vals = raw.astype(np.float64)
+            counts = np.bincount(key_of, minlength=len(param_keys))
+
+            parts = []
+            for order in np.flatnonzero(counts).tolist():
+                key = param_keys[order]
+                if key == "fd":
+                    stats = self.fd_stats
+                else:
+                    stats = self.size_stats.get(key)
+                    if stats is None:
+                        stats = RollingStats(window_size=param_window)
+                        self.size_stats[key] = stats
+                parts.append((stats, key == "fd"))
+
+            z, std, ready = _sequential_z(parts, vals, counts[counts > 0])
+            hit = ready & (z > param_z_thresh) & (std > 1.0)
+
+            for j in np.flatnonzero(hit).tolist():
+                order = int(key_of[j])
+                key = param_keys[order]
+                val = int(raw[j])
+                zj = float(z[j])
+                if key == "fd":
+                    a = Anomaly(
+                        timestamp=now,
+                        pid=0,
+                        anomaly_type="parameter",
+                        severity=min(zj / 15.0, 1.0),
+                        description=f"fd unusually high: {val}",
+                        details={"fd": val, "z": zj}
+                    )
+                else:
+                    name = syscall_name(int(ids[lo + rows[j]]))
+                    a = Anomaly(
+                        timestamp=now,
+                        pid=0,
+                        anomaly_type="parameter",
+                        severity=min(zj / 15.0, 1.0),
+                        description=f"weird {key} in {name}: {val}",
+                        details={"param": key, "value": val, "z": zj}
+                    )
+                found.append((lo + int(rows[j]), order, a))
+
+            end = 0
+            for (stats, _), m in zip(parts, counts[counts > 0].tolist()):
+                stats.extend(vals[end:end + m])
+                end += m
+
+        found.sort(key=lambda x: (x[0], x[1]))
+        return [a for _, _, a in found]
+
+
+def _sequential_z(parts, values, counts):
+    """
+    z score and std every value would have got from the per event path, all at once
+    parts: (stats, add_first) per key, values: every keys values back to back, counts[i] of them for parts[i]
+    value i is judged against its keys window as it was right before it was added
+    (right after when add_first, thats how the fd check works)
+    each keys window is its old window followed by its new values so results match event by event
+
+    values are taken relative to their keys median, windows of values close to it get their sums
+    from int64 prefix sums (exact, so z comes out the same as the per event path), the few windows
+    holding an outlier get a plain two pass over the window instead
+    """
+    w = parts[0][0].window.maxlen #every param key has a param_window sized window
+    near = 1 << ((62 - 2 * (w - 1).bit_length()) // 2) #w * S2 and S1^2 stay under 2^62 for |d| up to this
+
+    #one array for all keys, [old window, new values] per key, so the rest is one pass instead of one per key
+    segs, offset, first, add = [], [], [], []
+    pos = done = 0
+    for (stats, add_first), m in zip(parts, counts.tolist()):
+        k0 = len(stats.window)
+        seg = np.concatenate((np.fromiter(stats.window, float, k0), values[done:done + m]))
+        sample = np.sort(seg[::max(1, len(seg) // 63)]) #any typical value will do, a rough median is plenty
+        seg -= np.floor(sample[len(sample) // 2])
+        segs.append(seg)
+        offset.append(pos + k0 - done) #value i of this key sits at i + offset in d
+        first.append(pos)
+        add.append(1 if add_first else 0)
+        pos += len(seg)
+        done += m
+    d = np.concatenate(segs)
+    at = np.repeat(offset, counts) + np.arange(done) #where every value sits in d
+    ends = at + np.repeat(add, counts) #exclusive end of each values window
+    lens = np.minimum(ends - np.repeat(first, counts), w) #windows never reach back into the previous key
+    starts = ends - lens
+    ready = lens >= min_samples
+
+    far = np.abs(d) > near
+    di = np.where(far, 0, d).astype(np.int64)
+    c0 = np.concatenate(([0], np.cumsum(far)))
+    c1 = np.concatenate(([0], np.cumsum(di)))
+    c2 = np.concatenate(([0], np.cumsum(di * di))) #may wrap on a long chunk, window differences still come out right
+
+    #windows of near values: n^2 * var = n * S2 - S1^2 and n * |x - mean| = |n * x - S1|, all exact
+    #(x itself can be an outlier when it isnt part of its window, that just makes a big z)
+    clean = c0[ends] == c0[starts]
+    s1 = c1[ends] - c1[starts]
+    sd = np.sqrt((lens * (c2[ends] - c2[starts]) - s1 * s1).astype(np.float64))
+    use = ready & clean
+    std = np.where(use, sd / np.maximum(lens, 1), 0.0)
+    z = np.where(use & (sd > 0), np.abs(lens * d[at] - s1) / np.where(sd > 0, sd, 1.0), 0.0)
+
+    #windows with an outlier in them, a plain two pass over each
+    rest = np.flatnonzero(ready & ~clean)
+    full = rest[lens[rest] == w]
+    if len(full):
+        win = sliding_window_view(d, w)[starts[full]]
+        mu = win.mean(axis=1)
+        dev = win - mu[:, None]
+        sd = np.sqrt(np.einsum("ij,ij->i", dev, dev) / w)
+        std[full] = sd
+        z[full] = np.abs(d[at[full]] - mu) / np.where(sd > 0, sd, np.inf)
+    for i in rest[lens[rest] < w].tolist(): #still warming up, first window of a key only
+        win = d[starts[i]:ends[i]]
+        sd = win.std()
+        std[i] = sd
+        if sd > 0:
+            z[i] = abs(d[at[i]] - win.mean()) / sd
+    return z, std, ready
+
+
+def _cumcount(keys):
+    """for every element how many equal ones came before it in the array"""
+    order = np.argsort(keys, kind="stable")
+    s = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], s[1:] != s[:-1])))
+    run_start = np.repeat(starts, np.diff(np.append(starts, len(s))))
+    out = np.empty(len(keys), dtype=np.int64)
+    out[order] = np.arange(len(s)) - run_start
+    return out
+
+
+class SequenceDetector:
+    """
+    learns which syscall follows which for one process (bigrams of syscall ids)
+    and flags transitions that almost never happen once min_seq of them have been seen
+
+    counts live in a fixed size hashed uint32 table instead of dicts of names so memory per
+    pid is bounded, a collision only makes a transition look more normal so it cant cause
+    false positives. totals per id are a plain array since ids are already dense
+
+    it only ever sees what got past the capture (kernel category) filter, with a category unticked
+    its calls are just missing from the stream, so the model is of transitions between captured
+    syscalls not of the whole process. anything that loses events (drops, filter / sample rate changes)
+    comes with a gap and reset() so the call before and after the hole never count as a transition
+    """
+
+    def __init__(self, table_bits=seq_table_bits):
+        self.table_bits = table_bits
+        self.pairs = np.zeros(1 << table_bits, dtype=np.uint32) #hashed prev -> next counts
+        self.totals = np.zeros(max_syscalls, dtype=np.uint32) #times each id was followed by anything
+        self.learned = 0 #transitions seen so far
+        self.last = -1 #last id of the previous batch so transitions carry over between batches
+
+    def reset(self):
+        """forget the last id, the next batch doesnt follow on from the previous one (events were lost)"""
+        self.last = -1
+
+    def _slots(self, prev, nxt):
+        #multiplicative hash of the pair, top bits of the low 32
+        key = prev.astype(np.uint64) * np.uint64(max_syscalls) + nxt.astype(np.uint64)
+        h = (key * np.uint64(2654435761)) & np.uint64(0xFFFFFFFF)
+        return (h >> np.uint64(32 - self.table_bits)).astype(np.int64)
+
+    def analyze_batch(self, ids, now: float = None) -> List[Anomaly]:
+        """
+        ids: the full syscall id stream of this pid for one batch, in order
+        now: anomaly timestamp (default wall time)
+        every transition is judged against the model as it was right before it
+        (counts from earlier in the same batch included) then the batch is learned
+        """
+        ids = np.minimum(np.asarray(ids, dtype=np.int64), max_syscalls - 1)
+        if not len(ids):
+            return []
+        seq = ids if self.last < 0 else np.concatenate(([self.last], ids))
+        self.last = int(ids[-1])
+        if len(seq) < 2:
+            return []
+
+        prev, nxt = seq[:-1], seq[1:]
+        slots = self._slots(prev, nxt)
+        pair_before = self.pairs[slots] + _cumcount(slots)
+        prev_before = self.totals[prev] + _cumcount(prev)
+        learned = self.learned + np.arange(len(prev))
+
+        #add one smoothing, an id we know nothing about isnt suspicious yet, a transition
+        #never seen after thousands of that id is
+        p = (pair_before + 1) / (prev_before + max_syscalls)
+        sus = np.flatnonzero((learned >= min_seq) & (p < sequence_prob))
+
+        self.pairs += np.bincount(slots, minlength=len(self.pairs)).astype(np.uint32)
+        self.totals += np.bincount(prev, minlength=max_syscalls).astype(np.uint32)
+        self.learned += len(prev)
+        if self.totals.max() > seq_count_cap:
+            self.pairs >>= 1
+            self.totals >>= 1
+
+        if not len(sus):
+            return []
+        _, first = np.unique(slots[sus], return_index=True) #one report per transition per batch
+        out = []
+        now = time.time() if now is None else now
+        for i in sus[np.sort(first)].tolist():
+            pi = float(p[i])
+            severity = min(1.0, -math.log10(pi) / 5.0)
+            if severity < seq_severity_min:
+                continue
+            a, b = syscall_name(int(prev[i])), syscall_name(int(nxt[i]))
+            out.append(Anomaly(
+                timestamp=now,
+                pid=0,
+                anomaly_type="sequence",
+                severity=severity,
+                description=f"unusual sequence {a} -> {b}",
+                details={"from": a, "to": b, "p": pi}
+            ))
+        return out
+
+
+def _pack_windows(stats_list, width):
+    """rolling windows as one zero padded 2d array + how full each one is (None = never created)"""
+    vals = np.zeros((len(stats_list), width))
+    lens = np.zeros(len(stats_list), dtype=np.int32)
+    for i, stats in enumerate(stats_list):
+        if stats is not None and stats.window:
+            lens[i] = len(stats.window)
+            vals[i, :lens[i]] = stats.window
+    return vals, lens
+
+
+def _unpack_window(vals, lens, i, width):
+    n = int(lens[i])
+    if not n:
+        return None
+    stats = RollingStats(window_size=width)
+    stats.extend(vals[i, :n])
+    return stats
+
+
+def _profile_arrays(d: dict) -> dict:
+    """everything a pid has learned (frequency + parameter windows, sequence model) as flat arrays"""
+    freq, freq_len = _pack_windows([d["frequency"].category_rates.get(c) for c in SYSTYPES], freq_window)
+    p = d["parameter"]
+    param, param_len = _pack_windows([p.fd_stats] + [p.size_stats.get(k) for k in size_keys], param_window)
+    seq = d["sequence"]
+    return {
+        "freq": freq,
+        "freq_len": freq_len,
+        "param": param,
+        "param_len": param_len,
+        "seq_pairs": seq.pairs,
+        "seq_totals": seq.totals,
+        "seq_learned": np.array([seq.learned], dtype=np.uint64),
+    }
+
+
+def _apply_profile(d: dict, arrays: dict):
+    """
+    warm a pids detectors from profile arrays
+    sections whose shape doesnt match the current layout are skipped rather than trusted
+    """
+    freq, freq_len = arrays.get("freq"), arrays.get("freq_len")
+    if freq is not None and freq_len is not None and freq.shape == (len(SYSTYPES), freq_window):
+        for i, category in enumerate(SYSTYPES):
+            stats = _unpack_window(freq, freq_len, i, freq_window)
+            if stats is not None:
+                d["frequency"].category_rates[category] = stats
+
+    param, param_len = arrays.get("param"), arrays.get("param_len")
+    if param is not None and param_len is not None and param.shape == (len(param_keys), param_window):
+        p = d["parameter"]
+        p.fd_stats = _unpack_window(param, param_len, 0, param_window) or RollingStats(window_size=param_window)
+        for i, key in enumerate(size_keys, start=1):
+            stats = _unpack_window(param, param_len, i, param_window)
+            if stats is not None:
+                p.size_stats[key] = stats
+
+    seq = d["sequence"]
+    pairs, totals, learned = arrays.get("seq_pairs"), arrays.get("seq_totals"), arrays.get("seq_learned")
+    if pairs is not None and totals is not None and learned is not None \
+            and pairs.shape == seq.pairs.shape and totals.shape == seq.totals.shape:
+        seq.pairs[:] = pairs
+        seq.totals[:] = totals
+        seq.learned = int(learned[0])
+
 
 class AnomalyDetector:
     """
     combines all prior detectors
     analysis happens in chunks
+
+    exact_counts: frequency counts come from ingest_counts (in kernel aggregation)
+    instead of counting the buffered events, which may be sampled
     """
     
-    def __init__(self):
+    def __init__(self, exact_counts: bool = False):
         self.processes: Dict[int, dict] = {} #each pid has its own detectors for future sessions
         self.recent_anomalies = deque(maxlen=1000)  #recent anomalies (for ui)
         self.sensitivity = 1.0 #global mult
+        self.exact_counts = exact_counts
+        self.clock = None #stream time from ("clock", t) messages (replays), None = wall time
 
         self.event_buffer: Dict[int, list] = defaultdict(list) #buffer of raw syscall
+        self.raw_buffer: Dict[int, list] = defaultdict(list) #(ids, args) arrays from the tracer, analyzed as whole batches
+        self.seq_buffer: Dict[int, list] = defaultdict(list) #(ids, gap) full id streams per pid for the sequence detector
+
+    def now(self) -> float:
+        """wall time, or the stream time when the events come from a recorded trace"""
+        return time.time() if self.clock is None else self.clock
 
     def _get_detectors(self, pid: int) -> dict:
         #init detectors per process when first asked for
         if pid not in self.processes:
+            now = self.now()
             self.processes[pid] = {
-                "frequency": FrequencyDetector(),
+                "frequency": FrequencyDetector(now),
                 "parameter": ParameterDetector(),
-                "start_time": time.time(),
+                "sequence": SequenceDetector(),
+                "start_time": now,
                 "syscall_count": 0,
             }
         return self.processes[pid]
@@ -228,33 +635,99 @@ class AnomalyDetector:
         #js store the data for batching
         self.event_buffer[pid].append((name, category, args))
 
+    def ingest_raw(self, pid: int, ids, args, seq=None, gap=False):
+        """
+        raw syscall ids and 6 arg rows straight from a decoded batch, never parsed into dicts
+        seq is every id the pid made in that batch, in order, for the sequence detector
+        gap: events of this pid were lost right before seq, dont join it onto the previous one
+        """
+        if len(ids):
+            self.raw_buffer[pid].append((ids, args))
+        if seq is not None and len(seq):
+            self.seq_buffer[pid].append((seq, gap))
+        elif gap and pid in self.processes: #nothing to carry the gap, reset now
+            self.processes[pid]["sequence"].reset()
+
+    def ingest_counts(self, pid: int, counts: Dict[SysType, int], ts: float = None):
+        """
+        exact per category counts for one interval (read from the kernel counters)
+        ts: when they were read, the frequency detector measures its intervals between reads then
+        instead of on its own clock, so jitter never puts 0 or 2 reads worth of counts in one tick
+        """
+        d = self._get_detectors(pid)
+        freq = d["frequency"]
+        first = ts is not None and freq.counted_until is None
+        for category, n in counts.items():
+            if not first: #the first read covers however long the pid ran before it, nothing to divide by
+                freq.add_syscall(category, n)
+            d["syscall_count"] += n
+        if ts is not None:
+            if first:
+                freq.last_check_time = ts
+            freq.counted_until = ts
+
     def analyze_batch(self) -> List[Anomaly]:
         """process calls in chunks now rather then event based cuz its far too expesnive"""
         out = []
+        now = self.now()
 
         for pid, events in self.event_buffer.items():
             if not events:
                 continue
 
             d = self._get_detectors(pid)
+            param_out = []
 
             for name, category, args in events:
-                d["syscall_count"] += 1 #update freq
-                d["frequency"].add_syscall(category)
-                out.extend(d["parameter"].analyze_args(name, args))
+                if not self.exact_counts:
+                    d["syscall_count"] += 1 #update freq
+                    d["frequency"].add_syscall(category)
+                param_out.extend(d["parameter"].analyze_args(name, args))
 
-            freq_out = d["frequency"].check_and_update()
+            for a in param_out: #forgot to set pid
+                a.pid = pid
+            out.extend(param_out)
 
-            for a in freq_out: #forgot to set pid
+        for pid, chunks in self.raw_buffer.items(): #vectorized path
+            if not chunks:
+                continue
+            d = self._get_detectors(pid)
+            if len(chunks) == 1:
+                ids, args = chunks[0]
+            else:
+                ids = np.concatenate([c[0] for c in chunks])
+                args = np.concatenate([c[1] for c in chunks])
+
+            param_out = d["parameter"].analyze_batch(ids, args, now)
+            for a in param_out:
                 a.pid = pid
+            out.extend(param_out)
 
-            for a in out:
-                if a.pid == 0:
+        for pid, chunks in self.seq_buffer.items():
+            if not chunks:
+                continue
+            d = self._get_detectors(pid)
+            #one analyze per run of chunks between gaps, the model resets at each gap
+            starts = [i for i, (_, gap) in enumerate(chunks) if gap or i == 0] + [len(chunks)]
+            for lo, hi in zip(starts[:-1], starts[1:]):
+                if chunks[lo][1]:
+                    d["sequence"].reset()
+                run = [c[0] for c in chunks[lo:hi]]
+                seq_out = d["sequence"].analyze_batch(run[0] if len(run) == 1 else np.concatenate(run), now)
+                for a in seq_out:
                     a.pid = pid
+                out.extend(seq_out)
 
+        #frequency runs for every pid, with exact counts a pid can have counts but no sampled events
+        for pid, d in self.processes.items():
+            freq_out = d["frequency"].check_and_update(now)
+            for a in freq_out:
+                a.pid = pid
             out.extend(freq_out)
 
         self.event_buffer.clear()
+        self.raw_buffer.clear()
+        self.seq_buffer.clear()
 
         for a in out:
             a.severity = min(a.severity * self.sensitivity, 1.0)
@@ -269,7 +742,7 @@ class AnomalyDetector:
 
         d = self.processes[pid]
         return {
-            "uptime": time.time() - d["start_time"],
+            "uptime": self.now() - d["start_time"],
             "total_syscalls": d["syscall_count"],
         }
 
@@ -279,6 +752,443 @@ class AnomalyDetector:
     def clear_process(self, pid: int):
         self.processes.pop(pid, None) #when the proc exits
         self.event_buffer.pop(pid, None)
+        self.raw_buffer.pop(pid, None)
+        self.seq_buffer.pop(pid, None)
+
+    def set_sensitivity(self, level: float):
+        self.sensitivity = max(0.1,min(level,3.0)) # map between .1 and 3
+
+    def load_profile(self, pid: int, exe: str) -> bool:
+        """start a pid off with the saved baselines of its executable, False if there arent any"""
+        arrays = read_profile(profile_path(exe)) if exe else None
+        if arrays is None:
+            return False
+        _apply_profile(self._get_detectors(pid), arrays)
+        return True
+
+    def save_profile(self, pid: int, exe: str):
+        """write what a pid has learned to the profile of its executable"""
+        if not exe or pid not in self.processes:
+            return
+        write_profile(profile_path(exe), _profile_arrays(self.processes[pid]))
+
+
+def _handle_message(detector: AnomalyDetector, msg):
+    """apply one inbox message, shared by the thread worker and the engine processes"""
+    kind = msg[0]
+    if kind == "batch":
+        detector.ingest_raw(msg[1], msg[2], msg[3], msg[4], msg[5])
+    elif kind == "counts":
+        detector.ingest_counts(msg[1], msg[2], msg[3])
+    elif kind == "sensitivity":
+        detector.set_sensitivity(msg[1])
+    elif kind == "clear":
+        detector.clear_process(msg[1])
+    elif kind == "load":
+        detector.load_profile(msg[1], msg[2])
+    elif kind == "save":
+        detector.save_profile(msg[1], msg[2])
+    elif kind == "apply":
+        _apply_profile(detector._get_detectors(msg[1]), msg[2])
+    elif kind == "clock":
+        detector.clock = msg[1]
+
+
+class AnomalyWorker:
+    """
+    runs an AnomalyDetector on its own thread
+    the tracer just drops batches in the inbox and goes straight back to draining the buffer
+    so detection cost never shows up as kernel drops
+    anomalies come out on their own BatchQueue (self.anomalies) instead of riding on a SysCall
+    """
+
+    def __init__(self, detector: AnomalyDetector = None, analyze_interval=0.25, anomalies: BatchQueue = None, lossless=False):
+        self.detector = detector or AnomalyDetector(exact_counts=True)
+        self.anomalies = BatchQueue(maxsize=4096) if anomalies is None else anomalies
+        self.analyze_interval = analyze_interval
+        self.lossless = lossless #replays wait for room instead of dropping, there's no kernel buffer to protect
+
+        self._inbox = queue.Queue(maxsize=1024) #batches not events so this is plenty
+        self.dropped = 0 #events we had to skip because the worker fell behind
+        self.dropped_control = 0 #other messages (sensitivity, clear, profiles) that didnt fit
+        self._gaps = set() #pids that lost a batch, their next one goes out with gap set
+        self._unsent_saves = {} #pid: exe, profile saves that didnt fit, stop() sends them
+        self.running = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread.start()
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True #anything sent from here on is ignored
+        if not self.running:
+            return
+        try:
+            #saves that didnt fit earlier go ahead of stop, worth waiting a bit for on the way out
+            for pid, exe in self._unsent_saves.items():
+                self._inbox.put(("save", pid, exe), timeout=1.0)
+            self._unsent_saves.clear()
+            self._inbox.put(("stop",), timeout=1.0) #goes after anything already queued, profile saves included
+        except queue.Full:
+            pass
+        self._thread.join(timeout=2.0)
+        self.running = False
+
+    def _send(self, msg, events=0) -> bool:
+        """
+        never blocks, this runs on the tracer poll thread and the qt thread, a slow worker
+        would otherwise turn into kernel drops or a frozen ui. a full inbox drops and counts
+        events: how many events the message stands for (counted in dropped), 0 = control message
+        """
+        if self._stopped:
+            return False
+        try:
+            if self.lossless:
+                while not self._stopped:
+                    try:
+                        self._inbox.put(msg, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        pass
+                return False
+            self._inbox.put_nowait(msg)
+            return True
+        except queue.Full:
+            if events:
+                self.dropped += events
+            else:
+                self.dropped_control += 1
+            return False
+
+    def submit(self, pid: int, ids, args, seq=None, gap=False):
+        """
+        hand over a batch (numpy ids and arg rows, already copied out of the tracer batch)
+        seq: optional full id stream of the pid for the sequence detector
+        gap: events of this pid were lost before this batch (the worker adds its own drops to it)
+        """
+        n = len(ids) if seq is None else len(seq)
+        if self._send(("batch", pid, ids, args, seq, gap or pid in self._gaps), max(n, 1)):
+            self._gaps.discard(pid)
+        elif not self._stopped:
+            self._gaps.add(pid)
+
+    def submit_counts(self, pid: int, counts: Dict[SysType, int], ts: float = None):
+        """ts: when kernel counts were read (see AnomalyDetector.ingest_counts), None for per batch counts"""
+        self._send(("counts", pid, counts, ts), sum(counts.values()))
 
     def set_sensitivity(self, level: float):
-        self.sensitivity = max(0.1,min(level,3.0)) # map between .1 and 3
\ No newline at end of file
+        self._send(("sensitivity", level))
+
+    def set_clock(self, t: float):
+        """run detection on stream time t (trace timestamps) instead of the wall clock"""
+        self._send(("clock", t))
+
+    def clear_process(self, pid: int):
+        if pid in self._unsent_saves: #stop() still has to save it, clearing now would leave nothing to save
+            return
+        self._send(("clear", pid))
+
+    def load_profile(self, pid: int, exe: str):
+        """warm start pid from its executables profile (file io happens on the worker, not the caller)"""
+        self._send(("load", pid, exe))
+
+    def save_profile(self, pid: int, exe: str) -> bool:
+        """
+        queue a profile save, one that doesnt fit right now is kept and sent by stop()
+        False after stop(), the worker is gone and the save would be lost
+        """
+        if self._stopped:
+            return False
+        if not self._send(("save", pid, exe)):
+            self._unsent_saves[pid] = exe
+        return True
+
+    def apply_state(self, pid: int, arrays: dict):
+        """load profile arrays (see handover) into a pids detectors"""
+        self._send(("apply", pid, arrays))
+
+    def get_detector(self) -> AnomalyDetector:
+        return self.detector
+
+    def sync(self, timeout=5.0) -> bool:
+        """
+        block until the worker got through everything sent before this (analysis included, if a clock
+        message made one due), anomalies from it are on self.anomalies by then. False on timeout
+        """
+        done = threading.Event()
+        if not self.running or not self._send(("sync", done)):
+            return False
+        return done.wait(timeout)
+
+    def handover(self) -> dict:
+        """stop and return what every pid learned as profile arrays {pid: arrays}, for whoever takes over"""
+        self.stop()
+        return {pid: _profile_arrays(d) for pid, d in list(self.detector.processes.items())}
+
+    def _run(self):
+        last = None #set on the first pass, after the first message (a replays clock) had a chance to arrive
+        while self.running:
+            try:
+                msg = self._inbox.get(timeout=self.analyze_interval)
+                if msg[0] == "stop":
+                    break
+                if msg[0] == "sync": #the analysis after the previous message already ran
+                    msg[1].set()
+                else:
+                    _handle_message(self.detector, msg)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                print(f"[anomaly error] {e}")
+
+            now = self.detector.now() #stream time on replays, so analysis lands on the same events every run
+            if last is None or now < last: #switched to a stream clock, or a looped replay started over
+                last = now
+            if now - last >= self.analyze_interval:
+                last = now
+                try:
+                    out = self.detector.analyze_batch()
+                except Exception as e:
+                    print(f"[anomaly error] {e}")
+                    continue
+                if out:
+                    self.anomalies.put_batch(out)
+
+
+def _engine_main(inbox, outbox, analyze_interval, sensitivity):
+    """
+    body of one engine process
+    owns the detectors (frequency, parameter, sequence) for every pid sharded to it
+    everything going back to the parent is tagged, ("anomalies", [...]), ("state", {pid: arrays}) or ("synced", None)
+    """
+    detector = AnomalyDetector(exact_counts=True)
+    detector.set_sensitivity(sensitivity)
+    last = None
+    while True:
+        try:
+            msg = inbox.get(timeout=analyze_interval)
+            if msg[0] == "stop":
+                break
+            if msg[0] == "state":
+                outbox.put(("state", {pid: _profile_arrays(d) for pid, d in detector.processes.items()}))
+            elif msg[0] == "sync": #behind any anomalies already on the outbox, see AnomalyEngine.sync
+                outbox.put(("synced", None))
+            else:
+                _handle_message(detector, msg)
+        except queue.Empty:
+            pass
+        except Exception as e:
+            print(f"[anomaly error] {e}")
+
+        now = detector.now() #same as AnomalyWorker._run
+        if last is None or now < last:
+            last = now
+        if now - last >= analyze_interval:
+            last = now
+            try:
+                out = detector.analyze_batch()
+            except Exception as e:
+                print(f"[anomaly error] {e}")
+                continue
+            if out:
+                outbox.put(("anomalies", out))
+
+
+class AnomalyEngine:
+    """
+    process pool version of AnomalyWorker for tracing lots of pids at once
+    pids are sharded across worker processes (pid % workers) and each process owns
+    the detectors for its pids, so detection isnt stuck on one core behind the gil
+    anomalies are merged back into self.detector.recent_anomalies and self.anomalies
+    get_detector pulls a copy of every shards per pid state into self.detector when something wants to look
+
+    same interface as AnomalyWorker so the tracer doesnt care which one it has
+    spawn instead of fork cuz the parent is full of qt and tracer threads
+    """
+
+    def __init__(self, workers: int = None, analyze_interval=0.25, anomalies: BatchQueue = None, lossless=False):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.analyze_interval = analyze_interval
+        self.lossless = lossless #see AnomalyWorker
+
+        self.detector = AnomalyDetector(exact_counts=True) #merged recent_anomalies, per pid state only as of the last get_detector
+        self.anomalies = BatchQueue(maxsize=4096) if anomalies is None else anomalies
+        self.dropped = 0
+        self.dropped_control = 0
+        self.running = False
+        self._stopped = False
+        self._gaps = set() #pids that lost a batch, their next one goes out with gap set
+        self._unsent_saves = {} #pid: exe, profile saves that didnt fit, stop() sends them
+        self._states = queue.Queue() #state replies from the workers, see get_detector
+        self._synced = queue.Queue() #sync replies, see sync
+
+        self._ctx = mp.get_context("spawn")
+        self._outbox = self._ctx.Queue()
+        self._inboxes = []
+        self._procs = []
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for _ in range(self.workers):
+            inbox = self._ctx.Queue(maxsize=1024)
+            p = self._ctx.Process(
+                target=_engine_main,
+                args=(inbox, self._outbox, self.analyze_interval, self.detector.sensitivity),
+                daemon=True
+            )
+            p.start()
+            self._inboxes.append(inbox)
+            self._procs.append(p)
+        self._collector.start()
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        if not self.running:
+            return
+        self.running = False
+        for pid, exe in self._unsent_saves.items(): #saves that didnt fit earlier go ahead of stop
+            try:
+                self._shard(pid).put(("save", pid, exe), timeout=1.0)
+            except queue.Full:
+                pass
+        self._unsent_saves.clear()
+        for inbox in self._inboxes:
+            try:
+                inbox.put(("stop",), timeout=1.0) #queued after any profile saves so those still get written
+            except queue.Full:
+                pass
+        for p in self._procs:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+
+    def _shard(self, pid: int):
+        return self._inboxes[pid % len(self._inboxes)]
+
+    def _send(self, inbox, msg, events=0) -> bool:
+        """same as AnomalyWorker._send, never blocks, a full shard drops and counts"""
+        if not self.running:
+            return False
+        try:
+            if self.lossless:
+                while self.running:
+                    try:
+                        inbox.put(msg, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        pass
+                return False
+            inbox.put_nowait(msg)
+            return True
+        except queue.Full:
+            if events:
+                self.dropped += events
+            else:
+                self.dropped_control += 1
+            return False
+
+    def submit(self, pid: int, ids, args, seq=None, gap=False):
+        if not self.running:
+            return
+        n = len(ids) if seq is None else len(seq)
+        if self._send(self._shard(pid), ("batch", pid, ids, args, seq, gap or pid in self._gaps), max(n, 1)):
+            self._gaps.discard(pid)
+        else:
+            self._gaps.add(pid)
+
+    def submit_counts(self, pid: int, counts: Dict[SysType, int], ts: float = None):
+        if self.running:
+            self._send(self._shard(pid), ("counts", pid, counts, ts), sum(counts.values()))
+
+    def set_sensitivity(self, level: float):
+        self.detector.set_sensitivity(level) #workers started later get it from here
+        for inbox in self._inboxes:
+            self._send(inbox, ("sensitivity", level))
+
+    def set_clock(self, t: float):
+        for inbox in self._inboxes:
+            self._send(inbox, ("clock", t))
+
+    def clear_process(self, pid: int):
+        self.detector.clear_process(pid)
+        if self.running and pid not in self._unsent_saves: #same as AnomalyWorker.clear_process
+            self._send(self._shard(pid), ("clear", pid))
+
+    def load_profile(self, pid: int, exe: str):
+        if self.running:
+            self._send(self._shard(pid), ("load", pid, exe))
+
+    def save_profile(self, pid: int, exe: str) -> bool:
+        """see AnomalyWorker.save_profile"""
+        if not self.running:
+            return False
+        if not self._send(self._shard(pid), ("save", pid, exe)):
+            self._unsent_saves[pid] = exe
+        return True
+
+    def apply_state(self, pid: int, arrays: dict):
+        if self.running:
+            self._send(self._shard(pid), ("apply", pid, arrays))
+
+    def get_detector(self, timeout=1.0) -> AnomalyDetector:
+        """
+        the real detectors live in the worker processes, ask every shard for what its pids
+        learned (the same arrays a profile holds) and load that into self.detector
+        a shard that doesnt answer in time keeps what it had at the last call
+        """
+        asked = sum(self._send(inbox, ("state",)) for inbox in self._inboxes)
+        deadline = time.time() + timeout
+        for _ in range(asked):
+            try:
+                state = self._states.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                break
+            for pid, arrays in state.items():
+                _apply_profile(self.detector._get_detectors(pid), arrays)
+        return self.detector
+
+    def sync(self, timeout=5.0) -> bool:
+        """same as AnomalyWorker.sync, every shard answers once its done and the collector has its anomalies"""
+        asked = sum(self._send(inbox, ("sync",)) for inbox in self._inboxes)
+        deadline = time.time() + timeout
+        for _ in range(asked):
+            try:
+                self._synced.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                return False
+        return asked > 0 and asked == len(self._inboxes)
+
+    def handover(self) -> dict:
+        """stop and return what every pid learned as profile arrays {pid: arrays}, for whoever takes over"""
+        detector = self.get_detector()
+        self.stop()
+        return {pid: _profile_arrays(d) for pid, d in list(detector.processes.items())}
+
+    def _collect(self):
+        """merge anomalies from every worker back into one stream, state / sync replies go to get_detector / sync"""
+        while self.running:
+            try:
+                kind, payload = self._outbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if kind == "state":
+                self._states.put(payload)
+                continue
+            if kind == "synced":
+                self._synced.put(payload)
+                continue
+            self.detector.recent_anomalies.extend(payload)
+            self.anomalies.put_batch(payload)
\ No newline at end of file
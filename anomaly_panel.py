@@ -1,15 +1,161 @@
 from PyQt6.QtWidgets import *
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QAbstractTableModel, QSortFilterProxyModel, QModelIndex
 from PyQt6.QtGui import QColor
 from datetime import datetime
-from collections import deque
 from anomaly_detector import Anomaly
 
 
+anomaly_capacity = 5000 # rows kept in the panel, oldest fall off
+anomaly_flush_interval = 250 # ms, anomalies are queued and land in the table in one insert per flush
+anomaly_types = ["frequency", "parameter", "sequence"]
+
+#severity bands, shared by the colors, counters and the min severity filter
+sev_high = 0.7
+sev_med = 0.4
+
+
+class AnomalyTableModel(QAbstractTableModel):
+    """
+    ring buffer of Anomaly objects behind the table
+    append takes a whole batch: at most one remove (oldest rows) and one insert per call
+    cells are only formatted when the view asks, UserRole gives the raw value so sorting isnt by string
+    """
+
+    columns = ["Time", "PID", "type", "severity", "description", "details"]
+
+    def __init__(self, capacity=anomaly_capacity, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self._rows = [None] * capacity
+        self._start = 0
+        self._count = 0
+
+        #cache colors js to not create a million qcolor objs
+        self._col_cache = {
+            "high": QColor(229, 115, 115),
+            "med": QColor(255, 183, 77),
+            "low": QColor(255, 213, 79)
+        }
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.columns[section]
+        return None
+
+    def anomaly(self, row: int) -> Anomaly:
+        return self._rows[(self._start + row) % self.capacity]
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        a = self.anomaly(index.row())
+        col = index.column()
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if col == 0:
+                return datetime.fromtimestamp(a.timestamp).strftime("%H:%M:%S")
+            if col == 1:
+                return str(a.pid)
+            if col == 2:
+                return a.anomaly_type
+            if col == 3:
+                return f"{int(a.severity * 100)}%"
+            if col == 4:
+                return a.description
+            return self._details(a)[:100]
+        if role == Qt.ItemDataRole.UserRole: #sort key, asked o(n log n) times per sort so only build the one column
+            if col == 0:
+                return a.timestamp
+            if col == 1:
+                return a.pid
+            if col == 2:
+                return a.anomaly_type
+            if col == 3:
+                return a.severity
+            if col == 4:
+                return a.description
+            return self._details(a)
+        if role == Qt.ItemDataRole.BackgroundRole and col == 3:
+            if a.severity >= sev_high:
+                return self._col_cache["high"]
+            if a.severity >= sev_med:
+                return self._col_cache["med"]
+            return self._col_cache["low"]
+        if role == Qt.ItemDataRole.ToolTipRole and col == 5:
+            return self._details(a)
+        return None
+
+    @staticmethod
+    def _details(a: Anomaly) -> str:
+        return "".join(f" | {k}={v}" for k, v in a.details.items())
+
+    def append(self, batch):
+        """add a batch of anomalies, evicting the oldest once full"""
+        if not batch:
+            return
+        batch = batch[-self.capacity:]
+
+        evict = self._count + len(batch) - self.capacity
+        if evict > 0:
+            self.beginRemoveRows(QModelIndex(), 0, evict - 1)
+            for i in range(evict):
+                self._rows[(self._start + i) % self.capacity] = None
+            self._start = (self._start + evict) % self.capacity
+            self._count -= evict
+            self.endRemoveRows()
+
+        self.beginInsertRows(QModelIndex(), self._count, self._count + len(batch) - 1)
+        for a in batch:
+            self._rows[(self._start + self._count) % self.capacity] = a
+            self._count += 1
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+        self.endResetModel()
+
+
+class AnomalyFilterProxy(QSortFilterProxyModel):
+    """sorting (UserRole keys) and min severity / pid / type filtering on top of AnomalyTableModel"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.min_severity = 0.0
+        self.pid = None
+        self.anomaly_type = None
+        self.setSortRole(Qt.ItemDataRole.UserRole)
+        self.setDynamicSortFilter(True)
+
+    def set_filter(self, min_severity=0.0, pid=None, anomaly_type=None):
+        self.min_severity = min_severity
+        self.pid = pid
+        self.anomaly_type = anomaly_type
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        a = self.sourceModel().anomaly(source_row)
+        if a.severity < self.min_severity:
+            return False
+        if self.pid is not None and a.pid != self.pid:
+            return False
+        if self.anomaly_type is not None and a.anomaly_type != self.anomaly_type:
+            return False
+        return True
+
+
 class AnomalyPanel(QWidget):
     """
     panel for displaying anomalies
-    color coded by severity
+    color coded by severity, sortable and filterable (proxy over a ring buffer model)
 
     red - high 
     orange - medium
@@ -19,29 +165,30 @@ class AnomalyPanel(QWidget):
     def __init__(self):
         super().__init__()
 
-        self.anomalies = deque(maxlen=500) #save history for stats
-        self.max_rows = 100 #limit cuz lag
+        self.model = AnomalyTableModel()
+        self.proxy = AnomalyFilterProxy()
+        self.proxy.setSourceModel(self.model)
+        self._pending = [] #anomalies waiting for the next flush
 
-        self.high = 0 #counters for stats
+        self.total = 0 #counters for stats
+        self.high = 0
         self.med = 0
         self.low = 0
 
         self._build_ui()
 
         """
-        timer only updates stats text
-        table updates happen on insert
+        one timer updates stats text
+        the other pushes pending anomalies into the model, one insert per flush however big the burst
         """
         self.refresh_timer = QTimer(self)
         self.refresh_timer.timeout.connect(self._update_stats)
         self.refresh_timer.start(1000)
 
-        #cache colors js to not create a million qcolor objs
-        self._col_chache = { 
-            "high": QColor(229, 115, 115),
-            "med": QColor(255, 183, 77),
-            "low":QColor(255, 213, 79)
-        }
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self._flush)
+        self.flush_timer.start(anomaly_flush_interval)
+
     def _build_ui(self):
         # main layout
         layout = QVBoxLayout(self)
@@ -75,17 +222,42 @@ class AnomalyPanel(QWidget):
 
         layout.addLayout(header)
 
-        #anomaly table
-        self.table = QTableWidget(0, 6)
-        self.table.setHorizontalHeaderLabels([
-            "Time", "PID", "type", "severity", "description", "details"
-        ])
-
+        #filter bar, all done in the proxy so nothing gets rebuilt
+        filters = QHBoxLayout()
+        filters.addWidget(QLabel("min severity:"))
+        self.severity_filter = QComboBox()
+        for label, value in (("all", 0.0), ("medium", sev_med), ("high", sev_high)):
+            self.severity_filter.addItem(label, value)
+        self.severity_filter.currentIndexChanged.connect(self._apply_filter)
+        filters.addWidget(self.severity_filter)
+
+        filters.addWidget(QLabel("pid:"))
+        self.pid_filter = QLineEdit()
+        self.pid_filter.setPlaceholderText("any")
+        self.pid_filter.setMaximumWidth(80)
+        self.pid_filter.textChanged.connect(self._apply_filter)
+        filters.addWidget(self.pid_filter)
+
+        filters.addWidget(QLabel("type:"))
+        self.type_filter = QComboBox()
+        self.type_filter.addItem("all", None)
+        for t in anomaly_types:
+            self.type_filter.addItem(t, t)
+        self.type_filter.currentIndexChanged.connect(self._apply_filter)
+        filters.addWidget(self.type_filter)
+        filters.addStretch()
+
+        layout.addLayout(filters)
+
+        #anomaly table, a view over the proxy so sorting can stay on
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
         self.table.verticalHeader().setVisible(False)
         self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
-        self.table.setSortingEnabled(False) #sorting off cuz lag
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(0, Qt.SortOrder.DescendingOrder) #newest on top like before
         self.table.setAlternatingRowColors(False)
 
         #fixed widths
@@ -102,76 +274,51 @@ class AnomalyPanel(QWidget):
         layout.addWidget(self.stats_label)
 
     def add_anomaly(self, anomaly: Anomaly):
-        self.anomalies.append(anomaly) #store for stats
-
-        #update counters once
-        if anomaly.severity >= 0.7:
-            self.high += 1
-        elif anomaly.severity >= 0.4:
-            self.med += 1
-        else:
-            self.low += 1
-
-        #update table
-        self._append_row(anomaly)
-
-    def _append_row(self, anomaly: Anomaly):
-        """
-        insert new anomaly at top
-        block updates to avoid layout spam
-        """
-        self.table.setUpdatesEnabled(False)
-
-        if self.table.rowCount() >= self.max_rows:
-            self.table.removeRow(self.table.rowCount() - 1)
-
-        self.table.insertRow(0)
-
-        # time
-        ts = datetime.fromtimestamp(anomaly.timestamp).strftime("%H:%M:%S")
-        self.table.setItem(0, 0, QTableWidgetItem(ts))
-
-        self.table.setItem(0, 1, QTableWidgetItem(str(anomaly.pid))) #pid
-        self.table.setItem(0, 2, QTableWidgetItem(anomaly.anomaly_type))#type
-
-        #severity
-        sev_pct = int(anomaly.severity * 100)
-        sev_item = QTableWidgetItem(f"{sev_pct}%")
-        if anomaly.severity >= 0.7: #format colors from the cache like in tracer view
-            sev_item.setBackground(self._col_chache["high"])
-        elif anomaly.severity >= 0.4:
-            sev_item.setBackground(self._col_chache["med"])
-        else:
-            sev_item.setBackground(self._col_chache["low"])
-
-        self.table.setItem(0, 3, sev_item)
-
-        # desc
-        self.table.setItem(0, 4, QTableWidgetItem(anomaly.description))
-
-        details="" #get details from anomaly
-        for k,v in anomaly.details.items():
-            details += f" | {k}={v}"
-
-        self.table.setItem(0, 5, QTableWidgetItem(details[:100]))
-        self.table.setUpdatesEnabled(True)
+        self.add_anomalies([anomaly])
+
+    def add_anomalies(self, anomalies):
+        """queue a batch, counters update now and the table on the next flush"""
+        for a in anomalies:
+            if a.severity >= sev_high:
+                self.high += 1
+            elif a.severity >= sev_med:
+                self.med += 1
+            else:
+                self.low += 1
+        self.total += len(anomalies)
+        self._pending.extend(anomalies)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self.model.append(pending)
+
+    def _apply_filter(self, *_):
+        text = self.pid_filter.text().strip()
+        pid = int(text) if text.isdigit() else None
+        self.proxy.set_filter(
+            min_severity=self.severity_filter.currentData() or 0.0,
+            pid=pid,
+            anomaly_type=self.type_filter.currentData(),
+        )
 
     def _update_stats(self):
         #stats are cheap now
-        if not self.anomalies:
+        if not self.total:
             self.stats_label.setText("No anomalies detected")
             return
 
         self.stats_label.setText(
-            f"total: {len(self.anomalies)} | "
+            f"total: {self.total} | "
             f"high: {self.high} | medium: {self.med} | low: {self.low}"
         )
 
     def clear_anomalies(self):
         #reset everything
-        self.anomalies.clear()
-        self.high = self.med = self.low = 0
-        self.table.setRowCount(0)
+        self._pending.clear()
+        self.model.clear()
+        self.total = self.high = self.med = self.low = 0
         self.stats_label.setText("No anomalies detected")
 
     def get_sensitivity(self) -> float:
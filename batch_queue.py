@@ -0,0 +1,54 @@
+import threading
+
+"""
+BatchQueue, the batch handoff between producer threads (tracer, anomaly worker, enumeration pool) and the ui
+its own module so anything can use it without pulling in the syscall tables (syscall_helpers loads those from the cwd)
+"""
+
+
+class BatchQueue:
+    """
+    handoff between a producer thread (tracer) and the qt poller
+    producer pushes whole batches, the poller swaps the pending chunks out in one go
+    so its one lock per batch on each side instead of one per event like queue.Queue
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._chunks = [] #pending batches, swapped out whole by drain
+        self._size = 0
+        self.dropped = 0 #events that didnt fit
+        self.last_drained = 0
+
+    def __len__(self):
+        return self._size
+
+    def room(self):
+        """roughly how many more events fit (no lock, only a hint for the producer)"""
+        return max(0, self.maxsize - self._size)
+
+    def put_batch(self, items, skipped=0):
+        """add a batch, keeps the newest ones if it doesnt all fit, skipped = already dropped by the caller"""
+        with self._lock:
+            self.dropped += skipped
+            room = self.maxsize - self._size
+            if len(items) > room:
+                self.dropped += len(items) - room
+                items = items[len(items) - room:] if room > 0 else []
+            if items:
+                self._chunks.append(items)
+                self._size += len(items)
+
+    def drain(self) -> list:
+        """take everything produced since the last drain"""
+        with self._lock:
+            chunks, self._chunks = self._chunks, []
+            self._size = 0
+
+        if len(chunks) == 1:
+            out = chunks[0]
+        else:
+            out = [e for c in chunks for e in c]
+        self.last_drained = len(out)
+        return out
\ No newline at end of file
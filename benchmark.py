@@ -0,0 +1,639 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import statistics
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass
+import numpy as np
+from syscall_helpers import *
+from trace_log import TraceRecorder, TraceReader
+from sys_tracer import EventPipeline, SysTracer, evt_dtype, evt_size, batch_size
+from anomaly_detector import RollingStats, ParameterDetector, SequenceDetector, ARG_INDEX, param_keys
+
+"""
+headless benchmarks for the userspace side
+no root, bcc or qt needed so these run anywhere
+
+run with python3 benchmark.py <name> [--n N]
+"""
+
+stability_tolerance = 1e-6 # max relative error of the incremental stats vs exact before stability fails
+param_speedup_min = 10.0 # param_batch fails if the batch path is less than this many times faster than per event
+param_repeats = 3 # param_batch times each path this many times and keeps the best
+
+
+def synthetic_rows(n, seed=0):
+    """
+    fake decoded records (pid, syscall id, 6 raw args)
+    ids are drawn from syscalls we have signatures for so arg parsing actually does work
+    """
+    rng = random.Random(seed)
+    ids = [sid for sid, name in SYSCALL_TABLE.items() if name in SIGNATURES] or [0]
+    rows = []
+    for _ in range(n):
+        args = [rng.randrange(0, 1 << 16) for _ in range(6)]
+        rows.append((1234, rng.choice(ids), args))
+    return rows
+
+
+@dataclass
+class _DictSysCall:
+    """the old event layout (dataclass + parsed args dict per event) kept here for comparison"""
+    pid: int
+    name: str
+    timestamp: float
+    args: dict
+    event_type: SysType
+    anomalies: list = None
+
+
+def _bytes_per_event(build, rows):
+    """allocated bytes per event while all of them are alive (like a full queue / ui buffer)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    events = [build(r) for r in rows]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del events
+    return (after - before) / len(rows)
+
+
+def bench_memory(n):
+    """bytes per event for the old dict based SysCall vs the slotted raw arg one"""
+    rows = synthetic_rows(n)
+    now = time.time()
+
+    def old(r):
+        pid, sid, args = r
+        name = syscall_name(sid)
+        return _DictSysCall(pid, name, now, parse_syscall_args(name, tuple(args)), syscall_category_id(sid))
+
+    def new(r):
+        pid, sid, args = r
+        return SysCall(pid, sid, now, tuple(args), syscall_category_id(sid))
+
+    def new_read(r): #worst case, every event had its args looked at
+        sc = new(r)
+        sc.args
+        return sc
+
+    return {
+        "events": n,
+        "dict_dataclass": _bytes_per_event(old, rows),
+        "slots_raw": _bytes_per_event(new, rows),
+        "slots_raw_args_read": _bytes_per_event(new_read, rows),
+    }
+
+
+class _NaiveRollingStats:
+    """the old RollingStats (full pass per mean, two per std) for comparison"""
+
+    def __init__(self, window_size=100):
+        self.window = deque(maxlen=window_size)
+
+    def add(self, value):
+        self.window.append(value)
+
+    def mean(self):
+        if not self.window:
+            return 0.0
+        return sum(self.window) / len(self.window)
+
+    def std_dev(self):
+        if len(self.window) < 2:
+            return 0.0
+        avg = self.mean()
+        total = 0.0
+        for x in self.window:
+            diff = x - avg
+            total += diff * diff
+        return math.sqrt(total / len(self.window))
+
+    def z_score(self, value):
+        std = self.std_dev()
+        if std == 0:
+            return 0.0
+        return abs(value - self.mean()) / std
+
+
+def _stats_ops_per_sec(cls, window, ops, values):
+    """the detectors hot path: z + std check then add, once per value"""
+    s = cls(window_size=window)
+    start = time.perf_counter()
+    for i in range(ops):
+        v = values[i % len(values)]
+        s.z_score(v)
+        s.std_dev()
+        s.add(v)
+    return ops / (time.perf_counter() - start)
+
+
+def bench_rolling_stats(n):
+    """ops/s of the naive vs incremental RollingStats across window sizes"""
+    rng = random.Random(0)
+    values = [rng.gauss(4096, 512) for _ in range(4096)]
+    out = {}
+    for window in (10, 60, 100, 1000, 10000):
+        naive_ops = max(200, min(n, 2_000_000 // window)) #naive is o(window), dont wait forever on big ones
+        naive = _stats_ops_per_sec(_NaiveRollingStats, window, naive_ops, values)
+        fast = _stats_ops_per_sec(RollingStats, window, n, values)
+        out[f"window {window}"] = {
+            "naive ops/s": naive,
+            "incremental ops/s": fast,
+            "speedup": fast / naive,
+        }
+    return out
+
+
+def check_stability(n):
+    """
+    numerical stability of the incremental stats on huge fd / size values
+    compared against an exact two pass (statistics uses exact fractions)
+    returns max relative errors, main exits nonzero if any is above tolerance
+    or if a case never had any spread (a std of 0 compares as no error at all)
+    """
+    rng = random.Random(1)
+    cases = {
+        "large sizes": lambda: (1 << 40) + rng.randrange(0, 4096), #huge mean tiny spread, worst case for sum of squares
+        #huge fds, past 2^53 floats step by 2 so the spread is in steps of 2 (near 2^64 they all round to one value)
+        "2^53 fds": lambda: (1 << 53) + 2 * rng.randrange(0, 1 << 12),
+        "mixed": lambda: rng.choice((3, 4, 5, (1 << 63) + rng.randrange(0, 1 << 20))),
+    }
+    out = {}
+    worst = 0.0
+    spread = True
+    for name, gen in cases.items():
+        s = RollingStats(window_size=100)
+        err_mean = err_std = max_std = 0.0
+        for i in range(n):
+            s.add(gen())
+            if i % 97 == 0 and len(s.window) >= 2:
+                exact_mean = statistics.fmean(s.window)
+                exact_std = statistics.pstdev(s.window)
+                err_mean = max(err_mean, abs(s.mean() - exact_mean) / abs(exact_mean))
+                if exact_std > 0:
+                    err_std = max(err_std, abs(s.std_dev() - exact_std) / exact_std)
+                max_std = max(max_std, exact_std)
+        out[name] = {"mean rel err": err_mean, "std rel err": err_std, "max std": max_std}
+        worst = max(worst, err_mean, err_std)
+        spread &= max_std > 0
+    out["ok"] = worst < stability_tolerance and spread
+    return out
+
+
+def synthetic_param_batch(n, seed=2):
+    """
+    ids + raw arg rows for syscalls the parameter detector looks at
+    fds and sizes hover around normal values with the odd huge outlier
+    """
+    rng = np.random.default_rng(seed)
+    has_param = np.zeros(max_syscalls, dtype=bool)
+    for key in param_keys:
+        has_param |= ARG_INDEX[key] >= 0
+    ids = rng.choice(np.flatnonzero(has_param), n).astype(np.uint64)
+    return ids, _synthetic_args(ids, rng)
+
+
+def _synthetic_args(ids, rng):
+    """random raw args, with believable fds / sizes wherever the syscall has one"""
+    n = len(ids)
+    args = rng.integers(0, 1 << 16, (n, 6), dtype=np.uint64) #pointers / flags / whatever
+    for key in param_keys:
+        col = ARG_INDEX[key][ids]
+        rows = np.flatnonzero(col >= 0)
+        if key == "fd":
+            vals = rng.integers(3, 40, len(rows))
+        else:
+            vals = np.abs(rng.normal(4096, 900, len(rows))).astype(np.int64) + 1
+        outlier = rng.random(len(rows)) < 0.002
+        vals[outlier] = rng.integers(1 << 20, 1 << 30, outlier.sum())
+        args[rows, col[rows]] = vals.astype(np.uint64)
+    return args
+
+
+def bench_param_batch(n, batch=4096):
+    """
+    per event ParameterDetector.analyze_args (with the arg dict parse it needs)
+    vs the vectorized analyze_batch on the same stream
+    checks both flag the same events with the same z and that the batch path is param_speedup_min faster
+    """
+    ids, args = synthetic_param_batch(n)
+    names = [syscall_name(s) for s in ids.tolist()]
+    rows = args.tolist()
+
+    def run_per_event():
+        det = ParameterDetector()
+        out = []
+        for name, raw in zip(names, rows):
+            out.extend(det.analyze_args(name, parse_syscall_args(name, raw)))
+        return out
+
+    def run_batch():
+        det = ParameterDetector()
+        out = []
+        for i in range(0, n, batch):
+            out.extend(det.analyze_batch(ids[i:i + batch], args[i:i + batch]))
+        return out
+
+    #best of param_repeats for both, one run is at the mercy of whatever else the machine is doing
+    slow_t = fast_t = float("inf")
+    for _ in range(param_repeats):
+        start = time.perf_counter()
+        slow = run_per_event()
+        slow_t = min(slow_t, time.perf_counter() - start)
+        start = time.perf_counter()
+        fast = run_batch()
+        fast_t = min(fast_t, time.perf_counter() - start)
+
+    same = len(slow) == len(fast) and all(
+        a.description == b.description and math.isclose(a.details["z"], b.details["z"], rel_tol=1e-6)
+        for a, b in zip(slow, fast)
+    )
+    return {
+        "events": n,
+        "anomalies": len(slow),
+        "per event ev/s": n / slow_t,
+        "batch ev/s": n / fast_t,
+        "speedup": slow_t / fast_t,
+        "same anomalies": same,
+        "ok": same and slow_t / fast_t >= param_speedup_min,
+    }
+
+
+def synthetic_sequence(n, seed=3, rare=0.0005):
+    """
+    id stream from a small markov chain (each syscall has a few usual followers)
+    with the odd jump to a random id thrown in, returns (ids, where the jumps are)
+    """
+    rng = np.random.default_rng(seed)
+    states = rng.choice(max_syscalls, 40, replace=False)
+    follow = rng.integers(0, len(states), (len(states), 3))
+    pick = rng.integers(0, 3, n)
+    jumps = rng.random(n) < rare
+    ids = np.empty(n, dtype=np.uint16)
+    cur = 0
+    for i in range(n):
+        if jumps[i]:
+            ids[i] = rng.integers(0, max_syscalls)
+            continue
+        cur = follow[cur, pick[i]]
+        ids[i] = states[cur]
+    return ids, jumps
+
+
+def _naive_sequence_flags(det, ids, batch):
+    """
+    event by event reference for SequenceDetector: p of every transition it should report,
+    deduped the same way (first of each transition per batch)
+    """
+    from anomaly_detector import min_seq, sequence_prob, seq_severity_min
+    pairs = np.zeros(len(det.pairs), dtype=np.int64)
+    totals = np.zeros(max_syscalls, dtype=np.int64)
+    flagged = []
+    seen = set()
+    ids = ids.astype(np.int64)
+    slots = det._slots(ids[:-1], ids[1:]).tolist()
+    for i, (a, slot) in enumerate(zip(ids[:-1].tolist(), slots)):
+        p = (pairs[slot] + 1) / (totals[a] + max_syscalls)
+        key = ((i + 1) // batch, slot) #transition i is handled by the batch holding ids[i + 1]
+        if i >= min_seq and p < sequence_prob and -math.log10(p) / 5.0 >= seq_severity_min and key not in seen:
+            seen.add(key)
+            flagged.append(p)
+        pairs[slot] += 1
+        totals[a] += 1
+    return flagged
+
+
+def bench_sequence(n, batch=4096):
+    """
+    SequenceDetector throughput on the full id stream and a check that the vectorized
+    version flags the same transitions (same p) as judging them one at a time
+    """
+    ids, jumps = synthetic_sequence(n)
+    det = SequenceDetector()
+    start = time.perf_counter()
+    found = []
+    for i in range(0, n, batch):
+        found.extend(det.analyze_batch(ids[i:i + batch]))
+    took = time.perf_counter() - start
+
+    m = min(n, 100000) #the reference is slow, check a prefix
+    ref = _naive_sequence_flags(SequenceDetector(), ids[:m], batch)
+    check = SequenceDetector()
+    got = []
+    for i in range(0, m, batch):
+        got.extend(a.details["p"] for a in check.analyze_batch(ids[i:min(i + batch, m)]))
+    same = len(got) == len(ref) and all(math.isclose(a, b) for a, b in zip(got, ref))
+
+    return {
+        "events": n,
+        "injected jumps": int(jumps.sum()),
+        "anomalies": len(found),
+        "ev/s": n / took,
+        "table bytes/pid": det.pairs.nbytes + det.totals.nbytes,
+        "ok": same,
+    }
+
+
+def bench_trace_log(n, batch=4096):
+    """
+    trace recording: what write() costs the poll loop per batch, writer throughput,
+    bytes per event on disk (raw and compressed) and a read back through the index
+    """
+    ids, args = synthetic_param_batch(n)
+    src = np.zeros(n, dtype=evt_dtype)
+    src["pid"] = 1234
+    src["id"] = ids
+    src["args"] = args
+    t0 = 1000.0
+
+    out = {"events": n}
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for compress in (False, True):
+            path = os.path.join(tmp, f"trace{int(compress)}.log")
+            rec = TraceRecorder(path, compress=compress)
+            rec.start()
+            worst = 0.0
+            start = time.perf_counter()
+            for i in range(0, n, batch):
+                t = time.perf_counter()
+                rec.write(src[i:i + batch], t0 + i / n)
+                worst = max(worst, time.perf_counter() - t)
+            caller = time.perf_counter() - start
+            rec.close()
+            total = time.perf_counter() - start
+
+            reader = TraceReader(path)
+            back = np.concatenate(list(reader.chunks()))
+            ok &= rec.dropped == 0 and len(back) == n and (back["id"] == src["id"]).all() and (back["args"] == src["args"]).all()
+            mid = list(reader.chunks(t0 + 0.25, t0 + 0.5))
+            ok &= all(((c["ts"] >= t0 + 0.25) & (c["ts"] <= t0 + 0.5)).all() for c in mid)
+
+            name = "zlib" if compress else "raw"
+            out[name] = {
+                "write() us/batch": caller / max(1, n // batch) * 1e6,
+                "worst write() us": worst * 1e6,
+                "recorded ev/s": n / total,
+                "bytes/event": os.path.getsize(path) / n,
+                "chunks": len(reader.index),
+            }
+    out["ok"] = bool(ok)
+    return out
+
+
+"""
+syscall mixes for the pipeline benchmark, name -> {syscall: weight}
+None is every syscall we have a signature for, equally likely
+"""
+pipeline_mixes = {
+    "uniform": None,
+    "file": {"read": 30, "write": 25, "openat": 10, "close": 10, "newfstatat": 10, "lseek": 5, "pread64": 5, "mmap": 5},
+    "net": {"recvfrom": 25, "sendto": 25, "epoll_wait": 20, "read": 10, "write": 10, "accept4": 5, "connect": 5},
+    "idle": {"futex": 40, "clock_gettime": 30, "poll": 20, "read": 10},
+}
+pipeline_poll_records = 512 # records per simulated ring buffer poll
+pipeline_ui_interval = 0.05 # how often the fake ui drains, same as mains trace_timer
+
+
+def synthetic_records(n, mix="uniform", pids=(1234,), seed=4):
+    """syscall_evt records as the ring buffer would hand them over"""
+    rng = np.random.default_rng(seed)
+    ids_by_name = {name: sid for sid, name in SYSCALL_TABLE.items() if sid < max_syscalls}
+    weights = pipeline_mixes[mix]
+    if weights is None:
+        weights = {name: 1 for name in ids_by_name if name in SIGNATURES}
+    names = [name for name in weights if name in ids_by_name]
+    p = np.array([weights[name] for name in names], dtype=float)
+
+    rec = np.zeros(n, dtype=evt_dtype)
+    rec["id"] = np.array([ids_by_name[name] for name in names])[rng.choice(len(names), n, p=p / p.sum())]
+    rec["pid"] = np.array(pids)[rng.integers(0, len(pids), n)]
+    rec["args"] = _synthetic_args(rec["id"], rng)
+    return rec
+
+
+class _SyntheticTracer(EventPipeline):
+    """EventPipeline fed from memory through the exact record callback + drain SysTracer uses"""
+
+    transport = "synthetic"
+    _on_record = SysTracer._on_record
+    _drain = SysTracer._drain
+
+    def __init__(self, pids, **kw):
+        self._batch = np.zeros(batch_size, dtype=evt_dtype)
+        self._batch_addr = self._batch.ctypes.data
+        self._batch_len = 0
+        super().__init__(pids[0], aggregate=False, profiles=False, **kw)
+        for pid in pids[1:]:
+            self.track_pid(pid)
+
+    def _run(self):
+        pass #the benchmark loop is the poll thread
+
+
+def _timed(samples, fn):
+    """wrap fn so every call appends its duration to samples"""
+    def wrapper(*a, **kw):
+        t = time.perf_counter()
+        try:
+            return fn(*a, **kw)
+        finally:
+            samples.append(time.perf_counter() - t)
+    return wrapper
+
+
+def _percentiles(samples, scale=1e6):
+    """p50/p95/p99/max of durations in seconds, scaled (default us)"""
+    if not len(samples):
+        return {"n": 0}
+    a = np.asarray(samples, dtype=float) * scale
+    return {
+        "n": len(a),
+        "p50": float(np.percentile(a, 50)),
+        "p95": float(np.percentile(a, 95)),
+        "p99": float(np.percentile(a, 99)),
+        "max": float(a.max()),
+    }
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+
+def bench_pipeline(n, rate=0, mix="uniform", pids=1, engine="thread", analyze_interval=0.25):
+    """
+    end to end userspace pipeline on synthetic syscall_evt records
+    record callback -> batch drain / dispatch (pid filter, categorize, worker handoff, SysCall batch)
+    -> anomaly worker -> ui drain reading name / category / parsed args of every event
+
+    rate: offered events/s (0 = as fast as the callback goes)
+    stage latencies are per call in us: callback per record, dispatch per batch, analysis per
+    detector run, consume per ui drain. handoff is ms from dispatch until the ui drained the event
+    """
+    src = synthetic_records(n, mix, pids=tuple(1000 + i for i in range(pids)))
+    tracer = _SyntheticTracer(sorted(set(src["pid"].tolist())), engine=engine, analyze_interval=analyze_interval)
+
+    dispatch_t, analysis_t, consume_t, handoff, callback_t = [], [], [], [], []
+    tracer._dispatch = _timed(dispatch_t, tracer._dispatch)
+    if engine == "thread": #the process engine analyzes in other processes, cant time it from here
+        det = tracer.anomaly_worker.detector
+        det.analyze_batch = _timed(analysis_t, det.analyze_batch)
+
+    consumed = [0, 0] #events, anomalies
+    done = threading.Event()
+
+    def ui():
+        while True:
+            finished = done.is_set()
+            t = time.perf_counter()
+            evts = tracer.events.drain()
+            now = time.time()
+            for e in evts: #what rendering touches
+                e.name
+                e.event_type
+                e.args
+            if evts:
+                consume_t.append(time.perf_counter() - t)
+                handoff.append(now - evts[0].timestamp) #oldest in the drain, the worst one
+            consumed[0] += len(evts)
+            consumed[1] += len(tracer.anomalies.drain())
+            if finished:
+                break
+            time.sleep(pipeline_ui_interval)
+
+    rss0 = _rss_mb()
+    tracer.start()
+    consumer = threading.Thread(target=ui, daemon=True)
+    consumer.start()
+
+    base = src.ctypes.data
+    start = time.perf_counter()
+    for i in range(0, n, pipeline_poll_records):
+        j = min(i + pipeline_poll_records, n)
+        t = time.perf_counter()
+        for k in range(i, j):
+            tracer._on_record(None, base + k * evt_size, evt_size)
+        callback_t.append((time.perf_counter() - t) / (j - i))
+        tracer._drain() #end of the poll
+        if rate:
+            wait = start + j / rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+    took = time.perf_counter() - start
+
+    time.sleep(analyze_interval * 2) #let the worker and ui catch up
+    done.set()
+    consumer.join()
+    stats = tracer.get_stats()
+    tracer.stop()
+    rss1 = _rss_mb()
+
+    return {
+        "config": {"events": n, "rate": rate, "mix": mix, "pids": pids, "engine": engine,
+                   "analyze_interval": analyze_interval},
+        "ev/s": n / took,
+        "stages us": {
+            "callback per record": _percentiles(callback_t),
+            "dispatch per batch": _percentiles(dispatch_t),
+            "analysis per run": _percentiles(analysis_t),
+            "consume per drain": _percentiles(consume_t),
+        },
+        "handoff ms": _percentiles(handoff, 1e3),
+        "memory mb": {
+            "rss start": rss0,
+            "rss end": rss1,
+            "growth": rss1 - rss0,
+            "peak": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        "drops": {
+            "queue": stats["dropped_queue"],
+            "analysis": stats["dropped_analysis"],
+            "rate": (stats["dropped_queue"] + stats["dropped_analysis"]) / n,
+        },
+        "consumed": {"events": consumed[0], "anomalies": consumed[1]},
+    }
+
+
+BENCHMARKS = {
+    "memory": bench_memory,
+    "rolling_stats": bench_rolling_stats,
+    "stability": check_stability,
+    "param_batch": bench_param_batch,
+    "sequence": bench_sequence,
+    "trace_log": bench_trace_log,
+    "pipeline": bench_pipeline,
+}
+
+
+def _print(res, indent=0):
+    pad = " " * indent
+    for k, v in res.items():
+        if isinstance(v, dict):
+            print(f"{pad}{k}:")
+            _print(v, indent + 4)
+        elif isinstance(v, float):
+            print(f"{pad}{k:>24}: {v:,.6g}")
+        else:
+            print(f"{pad}{k:>24}: {v}")
+
+
+def _flatten(res, prefix=""):
+    out = {}
+    for k, v in res.items():
+        if isinstance(v, dict):
+            out.update(_flatten(v, f"{prefix}{k}/"))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[f"{prefix}{k}"] = v
+    return out
+
+
+def _compare(old, new):
+    """every number that moved, old -> new and by how much"""
+    a, b = _flatten(old), _flatten(new)
+    for k in b:
+        if k in a and a[k] != b[k]:
+            change = f"{(b[k] - a[k]) / abs(a[k]) * 100:+.1f}%" if a[k] else "new"
+            print(f"{k:>48}: {a[k]:,.6g} -> {b[k]:,.6g} ({change})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="sysmon userspace benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--n", type=int, default=100000, help="events per run")
+    parser.add_argument("--rate", type=float, default=0, help="pipeline: offered events/s, 0 = flat out")
+    parser.add_argument("--mix", choices=sorted(pipeline_mixes), default="uniform", help="pipeline: syscall mix")
+    parser.add_argument("--pids", type=int, default=1, help="pipeline: pids the events are spread over")
+    parser.add_argument("--engine", choices=("thread", "process"), default="thread", help="pipeline: anomaly engine")
+    parser.add_argument("--analyze-interval", type=float, default=0.25, help="pipeline: seconds between detector runs")
+    parser.add_argument("--json", metavar="PATH", help="also save the results here")
+    parser.add_argument("--compare", metavar="PATH", help="show what changed against an earlier --json run")
+    opts = parser.parse_args(argv)
+
+    if opts.name == "pipeline":
+        res = bench_pipeline(opts.n, rate=opts.rate, mix=opts.mix, pids=opts.pids,
+                             engine=opts.engine, analyze_interval=opts.analyze_interval)
+    else:
+        res = BENCHMARKS[opts.name](opts.n)
+    _print(res)
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            _compare(json.load(f)["result"], res)
+    if opts.json:
+        with open(opts.json, "w") as f:
+            json.dump({"benchmark": opts.name, "time": time.time(), "args": vars(opts), "result": res}, f, indent=2)
+    return 0 if res.get("ok", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
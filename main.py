@@ -1,21 +1,27 @@
-import sys, os
+import sys, os, argparse
 os.environ["QT_QPA_PLATFORM"] = "xcb"
 from PyQt6.QtWidgets import *
 from PyQt6.QtCore import Qt, QTimer
-from proc_util import ProcessUtil
-import psutil
+from proc_util import ProcessUtil, ProcSampler
+from process_table import ProcessTableModel, ProcessFilterProxy, COL_MEM
 
 from sys_tracer import SysTracer
+from trace_replay import TraceReplay
 from monitor_window import MonitorWindow
 
+icon_fill_batch = 200 # icons resolved per icon timer tick so a refresh never stalls on them
+
 
 class MonApp:
     """main app class holding ui and session logic"""
-    def __init__(self):
+    def __init__(self, record=None):
+        self.record = record #trace log path, live tracers record to it from the start (--record)
         self.proc = ProcessUtil()
+        self.sampler = ProcSampler() #cpu/mem for every process in one /proc sweep, on its own thread
+        self.sampler.start()
 
         self.all = []
-        self.filtered = []
+        self._icon_todo = [] #pids still waiting on an icon
 
         self.ui = MonUI(self)
         self.ui.show()
@@ -23,6 +29,11 @@ class MonApp:
         """monitor window for syscall tracers"""
         self.monitor = None
 
+        """
+        one tracer (one bpf program) follows every traced pid via its tracked_pids map
+        tracers maps each pid to it so the monitor sessions dont have to care
+        """
+        self.tracer = None
         self.tracers = {} #pid: systracer
         self.refresh()
 
@@ -39,48 +50,76 @@ class MonApp:
         self.trace_timer.timeout.connect(self.poll_tracers)
         self.trace_timer.start(50)
 
+        self.fill_timer = QTimer() #fills details and icons in as the workers / icon index get them
+        self.fill_timer.timeout.connect(self.fill_details)
+        self.fill_timer.start(100)
+
     def refresh(self):
         self.ui.set_status("loading processes")
         QApplication.processEvents()
 
         self.all = self.proc.get_all()
-        self.apply_filter("")
+        todo = self.ui.model.set_processes(self.all) #diffed against whats already in the table
+        snap = self.sampler.snapshot() #new rows get cpu / memory from the last sweep instead of waiting for the next tick
+        if snap is not None:
+            self.ui.model.update_live(snap.values())
+        self.proc.load_details(todo) #exe / daemon flag show up as the workers finish (fill_details)
 
         self.ui.set_status(f"{len(self.all)} processes")
 
     def apply_filter(self, qry):
-        qry = qry.lower().strip() #simple filtering
-
-        if not qry:
-            self.filtered = self.all
-        else:
-            self.filtered = []
-            for p in self.all:
-                if self.proc.matches(p, qry):
-                    self.filtered.append(p)
+        self.ui.proxy.set_query(qry) #simple filtering, the proxy just hides rows
+
+    def fill_details(self):
+        """apply whatever the enumeration workers finished, those rows can get their icon now (exe is known)"""
+        details = self.proc.details.drain()
+        if details:
+            self.ui.model.update_details(details)
+            self._icon_todo.extend(d[0] for d in details)
+        self.fill_icons()
+
+    def fill_icons(self):
+        """resolve a slice of the missing icons once the icon index is ready"""
+        if not self._icon_todo or not self.proc.icons.ready.is_set():
+            return
+        batch = self._icon_todo[:icon_fill_batch]
+        self._icon_todo = self._icon_todo[icon_fill_batch:]
 
-        self.ui.render(self.filtered)
+        model = self.ui.model
+        icons = {}
+        for pid in batch:
+            r = model.row_of(pid)
+            if r is not None and model.process(r).icon is None:
+                icons[pid] = self.proc.icon_for(model.process(r))
+        model.set_icons(icons)
 
     def tick(self):
-        """update cpu and memory usage for displayed processes"""
-        for p in self.filtered:
-            try:
-                proc = psutil.Process(p.pid)
-                p.mem = self.proc._get_mem_mb(proc) 
-            except:
-                pass
+        """push the samplers latest cpu and memory snapshot into the table"""
+        snap = self.sampler.snapshot()
+        if snap is not None:
+            self.ui.model.update_live(snap.values())
 
-        self.ui.update_live(self.filtered, self.proc)
+        if self.monitor is not None and self.tracer is not None: #throughput / backlog / drops
+            label = ",".join(str(p) for p in sorted(self.tracer.pids))
+            self.monitor.update_stats({label: self.tracer.get_stats()})
 
     def _monitor_closed(self): #just a little event, dont know how else i couldve done it lol
         self.monitor = None
+        self.tracer = None #window close stopped it
+        self.tracers = {}
         
     def trace_selected(self):
-        """loop over selected processes (i only allow 1 rn cuz of lag) and open a session for them"""
+        """
+        loop over selected processes and open a session for each
+        once more than one pid is tracked detection goes to the process pool engine so its not all on one core
+        """
         sel = self.ui.get_selected()
         if not sel:
             self.ui.set_status("nothing selected")
             return
+        if self.tracer is not None and not isinstance(self.tracer, SysTracer):
+            self.ui.set_status("replaying, close the monitor window to trace live") #a replay never gets kernel events
+            return
 
         if self.monitor is None:
             self.monitor = MonitorWindow(on_close=self._monitor_closed) #open window with the event callback
@@ -90,28 +129,57 @@ class MonApp:
             if pid in self.tracers:
                 continue
 
-            tracer = SysTracer(pid) #init ebpf tracer
-            tracer.start()
+            if self.tracer is None:
+                new = sum(1 for p, _ in sel if p not in self.tracers)
+                engine = "process" if new > 1 else "thread"
+                self.tracer = SysTracer(pid, engine=engine) #init ebpf tracer
+                if self.record:
+                    self.tracer.start_recording(self.record) #before start so the first batch is in it
+                self.tracer.start()
+            else:
+                self.tracer.track_pid(pid) #just another key in the kernel map
 
-            self.tracers[pid] = tracer
-            self.monitor.open_process((pid, name), tracer) #load tracer into a new tab on the window
+            self.tracers[pid] = self.tracer
+            self.monitor.open_process((pid, name), self.tracer) #load tracer into a new tab on the window
+
+        if self.tracer is not None and len(self.tracer.pids) > 1:
+            self.tracer.set_engine("process") #pids added to a running session count too, no-op if its already there
 
         self.ui.set_status(f"will trace {len(sel)} processes")
 
+    def open_replay(self, path, speed=1.0):
+        """play a recorded trace log into the monitor window instead of tracing live (no root or bcc needed)"""
+        if self.tracer is not None:
+            self.ui.set_status("already tracing")
+            return
+
+        if self.monitor is None:
+            self.monitor = MonitorWindow(on_close=self._monitor_closed)
+            self.monitor.show()
+
+        self.tracer = TraceReplay(path, speed=speed) #tabs get opened in poll_tracers as pids show up
+        self.tracer.start()
+        self.ui.set_status(f"replaying {os.path.basename(path)}")
+
     def poll_tracers(self):
         """
-        poll syscall tracer queues with a bounded per-tick limit
-        to prevent ui stalling for long
+        take everything each tracer produced since the last tick in one go
+        the batch queue caps how much can pile up if the ui falls behind
         """
-        m = 50
+        if self.monitor is None or self.tracer is None:
+            return
 
-        for pid, tracer in self.tracers.items():
-            for i in range(m):
-                try:
-                    evt = tracer.events.get_nowait()
-                    self.monitor.add_event(evt) 
-                except:
-                    break
+        for pid in self.tracer.pids.copy() - self.tracers.keys(): #replays find their pids as they go
+            self.tracers[pid] = self.tracer
+            self.monitor.open_process((pid, "replay"), self.tracer)
+
+        evts = self.tracer.events.drain() #every pid at once, add_event routes by evt.pid
+        if evts:
+            self.monitor.add_events(evts)
+
+        anomalies = self.tracer.anomalies.drain() #separate channel, detection runs on its own thread(s)
+        if anomalies:
+            self.monitor.add_anomalies(anomalies)
 
 
 class MonUI(QMainWindow):
@@ -151,87 +219,32 @@ class MonUI(QMainWindow):
 
         root.addLayout(bar)
 
-        self.table = QTableWidget(0, 8)
-        self.table.setHorizontalHeaderLabels([
-            "", "PID", "name", "user", "status", "cpu %", "memory (MB)", "type"
-        ])
+        """process table, pid keyed model with a search/sort proxy on top (process_table.py)"""
+        self.model = ProcessTableModel()
+        self.proxy = ProcessFilterProxy(self.app.proc.matches)
+        self.proxy.setSourceModel(self.model)
+
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
         self.table.verticalHeader().setVisible(False)
         self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
-        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection) #ctrl/shift click to trace several
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.setColumnWidth(0, 24)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(COL_MEM, Qt.SortOrder.DescendingOrder)
 
         root.addWidget(self.table)
 
         self.status = QLabel("ready")
         root.addWidget(self.status)
 
-    def render(self, procs):
-        """rebuild process table from scratch for refreshing"""
-        self.table.setSortingEnabled(False)
-
-        self.table.setRowCount(0)
-        for p in procs:
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-
-            icon_item = QTableWidgetItem()
-            if p.icon:
-                icon_item.setIcon(p.icon)
-
-            self.table.setItem(r, 0, icon_item)
-            self.table.setItem(r, 1, QTableWidgetItem(str(p.pid)))
-            self.table.setItem(r, 2, QTableWidgetItem(p.name))
-            self.table.setItem(r, 3, QTableWidgetItem(p.user or "NA"))
-            self.table.setItem(r, 4, QTableWidgetItem(p.status or "NA"))
-
-            cpu_item = QTableWidgetItem()
-            cpu_item.setData(Qt.ItemDataRole.EditRole, 0.0)
-
-            mem_item = QTableWidgetItem()
-            mem_item.setData(Qt.ItemDataRole.EditRole, p.mem)
-
-            d = "service"
-            if not p.daemon: # categorize daemons (not spot on accuracy tho)
-                d = "process"
-            type_item = QTableWidgetItem(d)
-
-            self.table.setItem(r, 5, cpu_item)
-            self.table.setItem(r, 6, mem_item)
-            self.table.setItem(r, 7, type_item)
-
-        self.table.setSortingEnabled(True)
-        self.table.sortItems(6, Qt.SortOrder.DescendingOrder)
-
-    def update_live(self, procs, util):
-        """update cpu and memory values without rebuilding the entire table"""
-        self.table.setSortingEnabled(False)
-
-        for r in range(self.table.rowCount()):
-            try:
-                pid = int(self.table.item(r, 1).text())
-                for p in procs:
-                    if p.pid == pid:
-                        cpu = util.get_cpu_percent(pid)
-                        self.table.item(r, 5).setData(Qt.ItemDataRole.EditRole, cpu)
-                        self.table.item(r, 6).setData(Qt.ItemDataRole.EditRole, p.mem)
-                        break
-            except:
-                pass
-
-        self.table.setSortingEnabled(True)
-
     def get_selected(self):
-        rows = []
-        for i in self.table.selectedItems():
-            rows.append(i.row())
-        rows = set(rows)
         o = []
-        for r in rows:
-            pid = int(self.table.item(r, 1).text())
-            name = self.table.item(r, 2).text()
-            o.append((pid, name))
+        for idx in self.table.selectionModel().selectedRows():
+            p = self.model.process(self.proxy.mapToSource(idx).row())
+            o.append((p.pid, p.name))
         return o
 
     def set_status(self, msg):
@@ -239,11 +252,19 @@ class MonUI(QMainWindow):
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="sysmon")
+    parser.add_argument("--replay", metavar="TRACE", help="play a recorded trace log instead of tracing live")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 = as fast as possible")
+    parser.add_argument("--record", metavar="TRACE", help="record traced processes to a trace log (for --replay)")
+    opts, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
 
     if os.path.exists("styles.css"):
         with open("styles.css") as f:
             app.setStyleSheet(f.read())
 
-    MonApp()
+    mon = MonApp(record=opts.record)
+    if opts.replay:
+        mon.open_replay(opts.replay, opts.speed)
     sys.exit(app.exec())
\ No newline at end of file
@@ -1,19 +1,19 @@
 from PyQt6.QtWidgets import *
 from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QTextCursor, QTextCharFormat, QColor
-from datetime import datetime
 import time
 
 from sys_tracer import *
-from syscall_helpers import syscall_category, SysType
+from syscall_helpers import SysType
 from anomaly_panel import AnomalyPanel
+from syscall_log import SyscallLogModel, SyscallLogView, to_records
 
 
 """
 simple syscall monitor window using tabbed views for multi tracing but its lowk impossible rn again bc of lag TODO FIX LAG (drop more calls)!!!
 -each tab represents a diff process
--supports category based filtering and the checkboxes are dynamically added based on the categorys TODO add customizable categories (u can make ur own)
+-supports category based filtering (capture = kernel side, show = retroactive view filter) and the checkboxes are dynamically added based on the categorys TODO add customizable categories (u can make ur own)
 -buffered log flushing to reduce ui lag by a lottttt
+-logs are a model/view over a ring buffer (syscall_log.py) so only visible lines ever get formatted
 """
 
 colformat = { 
@@ -29,7 +29,7 @@ colformat = {
     SysType.OTHER: "#b0bec5",
 }
 
-max_lines = 5000 # shouldnt lag too bad but ill probably add a widget to reduce this
+max_lines = 1_000_000 # scrollback per tab, costs memory (~60 bytes an event) but no ui time
 push_interval = 200
 """
 pushinterval=0.2 secs
@@ -41,9 +41,10 @@ class MonitorWindow(QMainWindow):
     window for displaying syscall activity
 
     -manages perprocess tracing sessions
-    -renders syscall logs with cached category coloring [ doesnt completley crash my linux vm now :) ]
+    -renders syscall logs with category coloring, only the rows on screen [ doesnt completley crash my linux vm now :) ]
     -applies ui side filtering so u can still get back any logs u dont currently display
-    TODO: i want to add writing to logs and make a chart allowing u to pick which categories go to which log itll be cool
+    -record streams the tracers raw events to a trace log (trace_log.py), main.py --replay plays those back
+    TODO: make a chart allowing u to pick which categories go to which log itll be cool
     """
 
     def __init__(self, on_close=None):
@@ -79,16 +80,6 @@ class MonitorWindow(QMainWindow):
             Qt.WindowType.WindowCloseButtonHint
         )
 
-        """
-        cache text formats per syscall category
-        to minimize formatting each line from scratch
-        """
-        self._col_cache = {}
-        for cat, col in colformat.items():
-            c = QTextCharFormat()
-            c.setForeground(QColor(col))
-            self._col_cache[cat] = c
-
         # flush to ui once every push_interval frames
         self.flush_timer = QTimer(self)
         self.flush_timer.timeout.connect(self._flush_all)
@@ -108,46 +99,69 @@ class MonitorWindow(QMainWindow):
         root = QVBoxLayout(w)
 
         
-        #category filter bar
-        bar = QHBoxLayout()
+        """
+        two category rows
+         -capture: what the tracer collects at all (kernel side filter, shared by every tab on that tracer)
+         -show: what this tab displays, everything captured is kept so this applies to old events too
+        """
+        capture_bar = QHBoxLayout()
+        capture_bar.addWidget(QLabel("capture"))
+        show_bar = QHBoxLayout()
+        show_bar.addWidget(QLabel("show"))
         checks = {}
+        shown = {}
 
         for st in SysType: # go over each systype and add teh checkbox (for future allowing ppl to add their own categories)
             cb = QCheckBox(st.value)
             cb.setChecked(st != SysType.OTHER)
             cb._category = st
             cb.stateChanged.connect(self._on_filter_changed)
-
             checks[st] = cb
-            bar.addWidget(cb)
+            capture_bar.addWidget(cb)
+
+            sb = QCheckBox(st.value)
+            sb.setChecked(True)
+            sb._category = st
+            sb._pid = pid
+            sb.stateChanged.connect(self._on_show_changed)
+            shown[st] = sb
+            show_bar.addWidget(sb)
 
-        bar.addStretch()
+        capture_bar.addStretch()
+        show_bar.addStretch()
 
         clear_btn = QPushButton("Clear")
         clear_btn.clicked.connect(lambda: self._clear_log(pid))
-        bar.addWidget(clear_btn)
+        show_bar.addWidget(clear_btn)
+
+        export_btn = QPushButton("Export")
+        export_btn.clicked.connect(lambda: self._export_log(pid))
+        show_bar.addWidget(export_btn)
 
-        root.addLayout(bar)
+        record_btn = QPushButton("Record") #whole tracer not just this tab, every tab on it shares the button state
+        record_btn.setCheckable(True)
+        record_btn.setChecked(tracer.recorder is not None) #--record starts it before the tab exists
+        record_btn.clicked.connect(lambda checked: self._toggle_recording(pid, checked))
+        show_bar.addWidget(record_btn)
+
+        root.addLayout(capture_bar)
+        root.addLayout(show_bar)
 
         """
         syscall log view
-        this uses manually adding to the buffer so we can push to the log
-        in chunks is much more optimized
+        events wait in pending and get pushed to the model in one batch per flush
         """
-     
-        log = QPlainTextEdit()
-        log.setReadOnly(True)
-
-        log._buffer = []
-        log._pending_lines = 0
-
+        log = SyscallLogView(SyscallLogModel(max_lines, colformat))
         root.addWidget(log)
 
         self.tabs.addTab(w, f"{name} [{pid}]")
         self.sessions[pid] = { # save the session with the format from earlier
             "log": log,
+            "pending": [],
             "checks": checks,
+            "shown": shown,
             "tracer": tracer,
+            "record": record_btn,
         }
 
     def closeEvent(self, event):
@@ -170,97 +184,123 @@ class MonitorWindow(QMainWindow):
             return
 
         category = cb._category
-        enabled = state == Qt.CheckState.Checked
+        enabled = cb.isChecked() #stateChanged hands over an int, it never equals the Qt.CheckState enum
 
       
-        #apply updated category filter to all tracers
+        #apply updated category filter to all tracers (once each, tabs share them), and keep the capture row of every tab in sync with it
+        done = set()
         for session in self.sessions.values():
-            session["tracer"].set_filter(category.value, enabled)
+            tracer = session["tracer"]
+            if id(tracer) not in done:
+                done.add(id(tracer))
+                tracer.set_filter(category.value, enabled)
+            other = session["checks"].get(category)
+            if other is not None and other is not cb:
+                other.blockSignals(True)
+                other.setChecked(enabled)
+                other.blockSignals(False)
+
+    def _on_show_changed(self, state):
+        """show row, refilters the tabs log from what it already has (no retrace)"""
+        cb = self.sender()
+        if not cb or cb._pid not in self.sessions:
+            return
+        session = self.sessions[cb._pid]
+        self._flush_log(session) #so pending events get the new filter too
+        session["log"].model().set_shown(cb._category, cb.isChecked())
+
+    def add_events(self, evts):
+        """batch version, main hands over everything drained from a tracer at once"""
+        for evt in evts:
+            self.add_event(evt)
+
+    def add_anomalies(self, anomalies):
+        """anomalies come from the tracers anomaly channel now, not attached to events"""
+        self.anomaly_panel.add_anomalies(anomalies)
+
+    def update_stats(self, stats):
+        """show throughput, backlog and drops per traced pid in the status bar"""
+        parts = []
+        for pid, s in stats.items():
+            parts.append(
+                f"[{pid}] {s['rate']:.0f} ev/s ({s['transport']}) | "
+                f"last tick {s['last_drained']} backlog {s['backlog']} | "
+                f"dropped kernel {s['dropped_kernel']} queue {s['dropped_queue']} analysis {s['dropped_analysis']}"
+                + (f" recording {s['dropped_recording']}" if s.get("dropped_recording") else "")
+            )
+        self.statusBar().showMessage("   ".join(parts))
 
     def add_event(self, evt: SysCall):
         """
         called by the tracer when it recieves an event
-        we just push it to the buffer and the buffer gets pushed to the actual visual
-        once every however many ms we set at the top 
+        we just push it to pending (whatever its category) and pending gets pushed to the log model
+        once every however many ms we set at the top, nothing is formatted here
         """
-     
-        pid = evt.pid
-        if pid not in self.sessions:
-            return
-
-        session = self.sessions[pid]
-        log = session["log"]
-        checkboxes = session["checks"]
-
-        category = syscall_category(evt.name)
 
-        if category in checkboxes and not checkboxes[category].isChecked():
+        session = self.sessions.get(evt.pid)
+        if session is None:
             return
-
-        ts = datetime.fromtimestamp(evt.timestamp).strftime("%H:%M:%S.%f")[:-3]
-        
-        # Mark anomalous syscalls with warning emoji
-        anomaly_marker = ""
-        if evt.anomalies:
-            anomaly_marker = "⚠️ "
-            # Add anomalies to the anomaly panel
-            for anomaly in evt.anomalies:
-                self.anomaly_panel.add_anomaly(anomaly)
-        
-        line = f"[{ts}] {anomaly_marker}[{category.name}] {evt.name} ({evt.args})"
-
-        log._buffer.append((line, category))
+        #nothing is dropped here anymore, the show row filters at render time so hidden events can come back
+        session["pending"].append(evt)
 
     def _flush_all(self): # push all da logs !!!!
         for session in self.sessions.values():
-            self._flush_log(session["log"])
+            self._flush_log(session)
 
-    def _flush_log(self, log: QPlainTextEdit):
-        """ 
-        read from the buffer
-        add cached formatting from earlier
-        push to ui
-        """
-     
-        if not log._buffer:
+    def _flush_log(self, session):
+        """pending events -> compact records -> one append on the model (the view follows the bottom itself)"""
+        pending = session["pending"]
+        if not pending:
             return
-
-        sb = log.verticalScrollBar()
-        at_bottom = (sb.value() == sb.maximum())
-
-        cursor = log.textCursor()
-        cursor.movePosition(cursor.MoveOperation.End)
-
-        for t, cat in log._buffer:
-            c = self._col_cache.get(cat) 
-            if c:
-                cursor.insertText(t + "\n", c)
-            else:
-                cursor.insertText(t + "\n")
-
-        log._pending_lines += len(log._buffer)
-        log._buffer.clear()
-
-        
-        #apply maximum line count by taking off lines from the top (this wont be an issue cuz u get to save to logs in the future so its ok)
-        l = log.blockCount()
-        if l > max_lines:
-            cursor = log.textCursor()
-            cursor.movePosition(cursor.MoveOperation.Start)
-            for i in range(l - max_lines):
-                cursor.select(cursor.SelectionType.BlockUnderCursor)
-                cursor.removeSelectedText()
-                cursor.deleteChar()
-
-        if at_bottom:
-            sb.setValue(sb.maximum())
+        session["log"].model().append(to_records(pending))
+        pending.clear()
 
     def _clear_log(self, pid):
         if pid not in self.sessions:
             return
-        log = self.sessions[pid]["log"]
-        log.clear()
-        log._buffer.clear()
+        session = self.sessions[pid]
+        session["log"].model().clear()
+        session["pending"].clear()
+
+    def _export_log(self, pid):
+        """save what the tab is showing right now (show filter applies) as text, lines are only formatted here"""
+        if pid not in self.sessions:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "export log", f"syscalls_{pid}.log", "log files (*.log *.txt)")
+        if not path:
+            return
+        session = self.sessions[pid]
+        self._flush_log(session)
+        try:
+            n = session["log"].model().export(path)
+            self.statusBar().showMessage(f"exported {n} lines to {path}", 5000)
+        except OSError as e:
+            QMessageBox.warning(self, "export failed", str(e))
+
+    def _toggle_recording(self, pid, on):
+        """start / stop recording the tracer behind this tab to a trace log"""
+        if pid not in self.sessions:
+            return
+        tracer = self.sessions[pid]["tracer"]
+        if on:
+            path, _ = QFileDialog.getSaveFileName(self, "record trace", f"trace_{pid}.log", "trace logs (*.log)")
+            if path:
+                try:
+                    tracer.start_recording(path)
+                    self.statusBar().showMessage(f"recording to {path}", 5000)
+                except OSError as e:
+                    QMessageBox.warning(self, "recording failed", str(e))
+        else:
+            tracer.stop_recording()
+            self.statusBar().showMessage("recording stopped", 5000)
+
+        recording = tracer.recorder is not None
+        for session in self.sessions.values(): #same sync as the capture row
+            if session["tracer"] is tracer:
+                btn = session["record"]
+                btn.blockSignals(True)
+                btn.setChecked(recording)
+                btn.blockSignals(False)
 
     def _on_sensitivity_changed(self, value):
         """Update sensitivity for all active tracers"""
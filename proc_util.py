@@ -1,7 +1,18 @@
-import psutil, os, time
+import psutil, os, time, json, shlex, threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from PyQt6.QtGui import QIcon
 from dataclasses import dataclass
+from batch_queue import BatchQueue
 
+sample_interval = 1.0 # seconds between /proc sweeps on the sampler thread
+clk_tck = os.sysconf("SC_CLK_TCK")
+page_size = os.sysconf("SC_PAGE_SIZE")
+icon_cache_path = os.path.expanduser("~/.cache/syscall-mon/icons.json")
+icon_cache_version = 2
+icon_wrappers = ("env", "flatpak") # launchers in Exec= lines, the process that shows up is whatever they run
+enum_workers = min(8, os.cpu_count() or 4) # threads filling in the expensive columns
+enum_chunk = 64 # pids per worker task, results land in the table a chunk at a time
 
 
 @dataclass
@@ -17,18 +28,271 @@ class ProcessData:
     status: str | None = None
     icon: QIcon | None = None
     daemon: bool=False
+    cpu: float = 0.0 #filled in by the live updates
+    exe: str | None = None
+
+@dataclass
+class ProcSnapshot:
+    """one /proc sweep, parallel arrays sorted by pid"""
+    time: float
+    pids: np.ndarray
+    cpu: np.ndarray #percent of one core since the previous sweep, 0 for new pids
+    mem: np.ndarray #rss in mb
+
+    def values(self) -> dict:
+        """{pid: (cpu, mem)} like ProcessTableModel.update_live wants"""
+        return dict(zip(self.pids.tolist(), zip(self.cpu.tolist(), self.mem.tolist())))
+
+
+class ProcSampler:
+    """
+    cpu and memory for every process from one pass over /proc
+    /proc/[pid]/stat has utime, stime, starttime and rss (same resident count as statm) so its one read per pid,
+    no psutil.Process objects. the previous sweep is kept as arrays and cpu % is one vectorized delta,
+    matched by pid and starttime so a reused pid doesnt get someone elses cpu time
+    start() runs sweeps on a thread, the ui just grabs snapshot() once per tick
+    """
+
+    def __init__(self, interval=sample_interval, proc="/proc"):
+        self.interval = interval
+        self.proc = proc
+        self._prev = None #(time, pids, starttime, ticks)
+        self._latest = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _read(self):
+        pids, start, ticks, rss = [], [], [], []
+        for name in os.listdir(self.proc):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"{self.proc}/{name}/stat", "rb") as f:
+                    raw = f.read()
+            except OSError: #exited mid sweep or no access
+                continue
+            f = raw[raw.rindex(b")") + 2:].split() #comm can have spaces, everything after it cant
+            pids.append(int(name))
+            ticks.append(int(f[11]) + int(f[12])) #utime + stime
+            start.append(int(f[19]))
+            rss.append(int(f[21]))
+        order = np.argsort(np.array(pids, dtype=np.int64), kind="stable")
+        return (np.array(pids, dtype=np.int64)[order], np.array(start, dtype=np.int64)[order],
+                np.array(ticks, dtype=np.float64)[order], np.array(rss, dtype=np.float64)[order])
+
+    def sample(self) -> ProcSnapshot:
+        """one sweep, returns (and publishes) the snapshot"""
+        now = time.time()
+        pids, start, ticks, rss = self._read()
+
+        cpu = np.zeros(len(pids))
+        if self._prev is not None and len(pids):
+            t0, ppids, pstart, pticks = self._prev
+            dt = now - t0
+            if len(ppids) and dt > 0:
+                i = np.minimum(np.searchsorted(ppids, pids), len(ppids) - 1)
+                same = (ppids[i] == pids) & (pstart[i] == start)
+                cpu[same] = np.maximum(ticks[same] - pticks[i[same]], 0) / clk_tck / dt * 100.0
+
+        self._prev = (now, pids, start, ticks)
+        snap = ProcSnapshot(now, pids, cpu, rss * (page_size / (1024 * 1024)))
+        self._latest = snap
+        return snap
+
+    def snapshot(self):
+        """latest published sweep, None before the first one"""
+        return self._latest
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"[sampler error] {e}")
+            self._stop.wait(self.interval)
+
+
+def _app_dirs():
+    """where .desktop files live (xdg data dirs + flatpak exports), only the ones that exist"""
+    home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    dirs = [home] + (os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share").split(":")
+    dirs += ["/var/lib/flatpak/exports/share", os.path.expanduser("~/.local/share/flatpak/exports/share")]
+    out = []
+    for d in dirs:
+        d = os.path.join(d, "applications")
+        if d not in out and os.path.isdir(d):
+            out.append(d)
+    return out
+
+
+def _exec_program(cmdline):
+    """
+    the program an Exec= line ends up running, past env / flatpak wrappers
+    None when theres no telling (flatpak run without --command, the process is whatever the app ships)
+    """
+    try:
+        parts = shlex.split(cmdline)
+    except ValueError: #unbalanced quotes, close enough
+        parts = cmdline.split()
+    while parts and os.path.basename(parts[0]) in icon_wrappers:
+        if os.path.basename(parts[0]) == "flatpak":
+            cmd = [p[len("--command="):] for p in parts if p.startswith("--command=")]
+            return cmd[0] if cmd else None
+        parts = parts[1:]
+        while parts and ("=" in parts[0] or parts[0].startswith("-")): #env FOO=1 -u BAR prog %U
+            parts = parts[1:]
+    return parts[0] if parts else None
+
+
+class IconIndex:
+    """
+    executable basename -> theme icon name, built once instead of scanning every desktop app per process
+    build runs on a thread and the result is cached on disk, keyed by the mtimes of the application dirs
+    and every dir under them (installing / removing an app touches its dir so the cache rebuilds then)
+    uses gio when its there, otherwise reads the .desktop files itself
+    """
+
+    def __init__(self, path=icon_cache_path):
+        self.path = path
+        self.index = {}
+        self.ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._build, daemon=True)
+        self._thread.start()
+
+    def lookup(self, exe, name):
+        """icon name for a process, None if nothing matches (or the index isnt built yet)"""
+        for key in (exe and os.path.basename(exe), name):
+            if key:
+                icon = self.index.get(key.lower())
+                if icon:
+                    return icon
+        return None
+
+    def _key(self):
+        #every walked dir, vendor subdirs (applications/kde4 ...) get new .desktop files without touching the top one
+        key = {}
+        for d in _app_dirs():
+            for root, _, _ in os.walk(d):
+                try:
+                    key[root] = os.stat(root).st_mtime
+                except OSError:
+                    pass
+        return key
+
+    def _build(self):
+        try:
+            key = self._key()
+            cached = self._load(key)
+            if cached is not None:
+                self.index = cached
+            else:
+                self.index = self._scan_gio()
+                if self.index is None:
+                    self.index = self._scan_files(_app_dirs())
+                self._save(key)
+        except Exception as e:
+            print(f"[icon index error] {e}")
+        self.ready.set()
+
+    def _load(self, key):
+        try:
+            with open(self.path) as f:
+                d = json.load(f)
+            if d.get("version") == icon_cache_version and d.get("key") == key:
+                return d["index"]
+        except:
+            pass
+        return None
+
+    def _save(self, key):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": icon_cache_version, "key": key, "index": self.index}, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass #no cache, just rebuild next time
+
+    def _scan_gio(self):
+        try:
+            import gi
+            gi.require_version("Gio", "2.0")
+            from gi.repository import Gio
+        except:
+            return None
+        out = {}
+        for a in Gio.AppInfo.get_all():
+            try:
+                exe = _exec_program(a.get_commandline() or a.get_executable() or "") #not flatpak for every flatpak app
+                gicon = a.get_icon()
+                if exe and gicon:
+                    out.setdefault(os.path.basename(exe).lower(), gicon.to_string())
+            except:
+                pass
+        return out
+
+    def _scan_files(self, dirs):
+        out = {}
+        for d in dirs:
+            for root, _, files in os.walk(d):
+                for fn in files:
+                    if not fn.endswith(".desktop"):
+                        continue
+                    exe = icon = None
+                    section = None
+                    try:
+                        with open(os.path.join(root, fn), errors="replace") as f:
+                            for line in f:
+                                line = line.strip()
+                                if line.startswith("["):
+                                    section = line
+                                elif section == "[Desktop Entry]":
+                                    if line.startswith("Exec=") and exe is None:
+                                        exe = _exec_program(line[5:])
+                                    elif line.startswith("Icon=") and icon is None:
+                                        icon = line[5:]
+                    except OSError:
+                        continue
+                    if exe and icon:
+                        out.setdefault(os.path.basename(exe).lower(), icon)
+        return out
+
 
 class ProcessUtil:
     def __init__(self):
         self._last_cpu_check = {} #pid: (cpu_time, timestamp)
-        self._gio_ok = False # i guess we can utilize the dumbness of me making a util class an instantiable object (ill change this when i get to it its not top priority)
-        self._gio = None
-        self._icon_cache = {}
+        self._icon_cache = {} #process name: QIcon
+        self._pool = ThreadPoolExecutor(max_workers=enum_workers, thread_name_prefix="enum")
+        self._pending = [] #(future, pids) of the last load_details
+        self.details = BatchQueue(maxsize=1 << 20) #(pid, daemon, exe) from the workers, drained by the ui
+        self.icons = IconIndex() # i guess we can utilize the dumbness of me making a util class an instantiable object
+        self.icons.start() #builds (or loads) on its own thread, icons get filled in once its ready
         
     def get_all(self):
         """
         get all running processes
         main entry point
+        only the cheap columns (pid name user status), exe / daemon flag come from load_details
+        and memory / cpu from the ProcSampler sweeps
         """
         out = []
 
@@ -38,12 +302,9 @@ class ProcessUtil:
                 name = p.info.get("name") or "???"
                 user = p.info.get("username")
                 status = p.info.get("status")
+                icon = self._icon_cache.get(name) #only already resolved ones, the rest get filled in later (icon_for)
 
-                mem = self._get_mem_mb(p)
-                icon = self._get_icon(p)
-                daemon = self._daemon_check(p)
-
-                out.append(ProcessData(pid, name, mem, user, status, icon, daemon)) #create processdata dataclass and push
+                out.append(ProcessData(pid, name, 0.0, user, status, icon)) #create processdata dataclass and push
             except:
                 #process died or access denied
                 continue
@@ -51,6 +312,36 @@ class ProcessUtil:
         out.sort(key=lambda x: x.pid)
         return out
 
+    def load_details(self, pids):
+        """
+        fill in the expensive columns on the worker pool, results show up on self.details chunk by chunk
+        chunks from an earlier call that havent started get folded into this one instead of queueing twice
+        """
+        carry = []
+        for f, chunk in self._pending:
+            if f.cancel():
+                carry.extend(chunk)
+        pids = list(dict.fromkeys(carry + list(pids)))
+        self._pending = []
+        for i in range(0, len(pids), enum_chunk):
+            chunk = pids[i:i + enum_chunk]
+            self._pending.append((self._pool.submit(self._details_chunk, chunk), chunk))
+
+    def _details_chunk(self, pids):
+        out = []
+        for pid in pids:
+            try:
+                p = psutil.Process(pid)
+                daemon = self._daemon_check(p) #one stat read
+                try:
+                    exe = p.exe() #one readlink
+                except:
+                    exe = None
+                out.append((pid, daemon, exe)) #memory comes from ProcSampler with cpu, no statm read here
+            except:
+                continue #process died or access denied
+        self.details.put_batch(out)
+
     def _get_mem_mb(self, p):
         """get memory in mb"""
         try:
@@ -58,53 +349,26 @@ class ProcessUtil:
         except:
             return 0.0
 
-    def _init_gio(self): 
-        """initialize gio on runtime only if you have the package"""
-        if self._gio_ok:
-            return
-        try:
-            # run here instead of for each process (on the get icon)
-            import gi 
-            gi.require_version("Gio", "2.0")
-            from gi.repository import Gio
-            self._gio = Gio
-            self._gio_ok = True
-        except:
-            self._gio_ok = False
-
-
-    def _get_icon(self, p):
+    def icon_for(self, proc: ProcessData):
         """
         try to grab icon from gotten path
         sometimes wont work but its fine
         why is this such an issue on linux 😭
-        tried to implement this better using gio now
+        exe -> icon name comes from the prebuilt IconIndex, None while its still building
+        QIcons are made here on the ui thread and cached per process name
         """
-        
-        name = p.name()
-        
+        if not self.icons.ready.is_set():
+            return None
+
+        name = proc.name
         #cache icons for refreshes
         if name in self._icon_cache:
             return self._icon_cache[name]
         icon = None
 
-        #try gio desktop app icons first
-        self._init_gio()
-        if self._gio_ok:
-            try:
-                exe = p.exe()
-                base = os.path.basename(exe) #try finding by executable name
-                for a in self._gio.AppInfo.get_all(): #more efficient icon finding
-                    try:
-                        if base.lower() in a.get_executable().lower():
-                            gicon = a.get_icon()
-                            if gicon:
-                                icon = QIcon.fromTheme(gicon.to_string())
-                                break
-                    except:
-                        pass
-            except:
-                pass
+        icon_name = self.icons.lookup(proc.exe, name)
+        if icon_name:
+            icon = QIcon(icon_name) if os.path.isabs(icon_name) else QIcon.fromTheme(icon_name)
 
         #qt theme icon fallback
         if not icon or icon.isNull():
@@ -129,7 +393,7 @@ class ProcessUtil:
         return False
 
     def get_cpu_percent(self, pid): 
-        """get cpu usage manually prepping for real tracer logic""" 
+        """get cpu usage manually prepping for real tracer logic (the table uses ProcSampler now)""" 
 
         #this was before i wrote the tracer, idk why i took the time to do this but i wont just delete it 
         try:
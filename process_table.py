@@ -0,0 +1,183 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QSortFilterProxyModel, QModelIndex
+from proc_util import ProcessData
+
+"""
+process list for the main window as a model/view
+rows are keyed by pid, a refresh is a diff (removed / changed / added rows only) and live cpu/mem
+updates go straight to a row through the pid -> row index, searching and sorting are a proxy on top
+"""
+
+COL_ICON, COL_PID, COL_NAME, COL_USER, COL_STATUS, COL_CPU, COL_MEM, COL_TYPE = range(8)
+
+
+class ProcessTableModel(QAbstractTableModel):
+    """
+    one ProcessData per row, pid -> row in _row_of
+    rows only move when some get removed, so the index is rebuilt then and nowhere else
+    """
+
+    columns = ["", "PID", "name", "user", "status", "cpu %", "memory (MB)", "type"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._row_of = {} #pid: row
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.columns[section]
+        return None
+
+    def process(self, row: int) -> ProcessData:
+        return self._rows[row]
+
+    def row_of(self, pid: int):
+        return self._row_of.get(pid)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        p = self._rows[index.row()]
+        col = index.column()
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if col == COL_PID:
+                return str(p.pid)
+            if col == COL_NAME:
+                return p.name
+            if col == COL_USER:
+                return p.user or "NA"
+            if col == COL_STATUS:
+                return p.status or "NA"
+            if col == COL_CPU:
+                return f"{p.cpu:.1f}"
+            if col == COL_MEM:
+                return f"{p.mem:.1f}"
+            if col == COL_TYPE:
+                return "service" if p.daemon else "process" # categorize daemons (not spot on accuracy tho)
+            return None
+        if role == Qt.ItemDataRole.UserRole: #sort key, numbers sort as numbers
+            return (None, p.pid, p.name.lower(), p.user or "", p.status or "", p.cpu, p.mem, p.daemon)[col]
+        if role == Qt.ItemDataRole.DecorationRole and col == COL_ICON:
+            return p.icon
+        if role == Qt.ItemDataRole.TextAlignmentRole and col in (COL_PID, COL_CPU, COL_MEM):
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def _changed(self, rows, first_col=0, last_col=None):
+        """one dataChanged over the span of rows that changed instead of one per cell"""
+        if not rows:
+            return
+        last_col = len(self.columns) - 1 if last_col is None else last_col
+        self.dataChanged.emit(self.index(min(rows), first_col), self.index(max(rows), last_col))
+
+    def set_processes(self, procs) -> list:
+        """
+        apply a fresh process list as a diff
+        removed pids go in contiguous runs, changed rows get one dataChanged, new pids one insert at the end
+        a refresh only brings the cheap columns, rows that stay keep their mem / cpu / daemon / exe / icon
+        returns the pids that need details (new ones and ones that exec'd into something else)
+        """
+        new = {p.pid: p for p in procs}
+
+        gone = sorted((self._row_of[pid] for pid in self._row_of.keys() - new.keys()), reverse=True)
+        if gone:
+            #walk the runs from the bottom so earlier row numbers stay valid
+            i = 0
+            while i < len(gone):
+                hi = lo = gone[i]
+                while i + 1 < len(gone) and gone[i + 1] == lo - 1:
+                    i += 1
+                    lo = gone[i]
+                self.beginRemoveRows(QModelIndex(), lo, hi)
+                del self._rows[lo:hi + 1]
+                self.endRemoveRows()
+                i += 1
+            self._row_of = {p.pid: r for r, p in enumerate(self._rows)}
+
+        changed = []
+        stale = []
+        for r, old in enumerate(self._rows):
+            p = new[old.pid]
+            if (p.name, p.user, p.status) != (old.name, old.user, old.status):
+                if p.name != old.name:
+                    old.icon = p.icon
+                    stale.append(old.pid)
+                old.name, old.user, old.status = p.name, p.user, p.status
+                changed.append(r)
+        self._changed(changed)
+
+        added = [p for pid, p in new.items() if pid not in self._row_of]
+        if added:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(added) - 1)
+            for p in added:
+                self._row_of[p.pid] = len(self._rows)
+                self._rows.append(p)
+            self.endInsertRows()
+        return stale + [p.pid for p in added]
+
+    def update_details(self, details):
+        """[(pid, daemon, exe)] from the enumeration workers, one dataChanged over the rows touched"""
+        rows = []
+        for pid, daemon, exe in details:
+            r = self._row_of.get(pid)
+            if r is None:
+                continue
+            p = self._rows[r]
+            p.daemon, p.exe = daemon, exe
+            rows.append(r)
+        self._changed(rows, COL_TYPE, COL_TYPE)
+
+    def set_icons(self, icons: dict):
+        """{pid: QIcon} as they get resolved, one dataChanged for the icon column"""
+        rows = []
+        for pid, icon in icons.items():
+            r = self._row_of.get(pid)
+            if r is not None and icon is not None:
+                self._rows[r].icon = icon
+                rows.append(r)
+        self._changed(rows, COL_ICON, COL_ICON)
+
+    def update_live(self, values: dict):
+        """{pid: (cpu, mem)}, o(1) per pid through the index, one dataChanged for the cpu/mem columns"""
+        rows = []
+        for pid, (cpu, mem) in values.items():
+            r = self._row_of.get(pid)
+            if r is None:
+                continue
+            p = self._rows[r]
+            if p.cpu != cpu or p.mem != mem:
+                p.cpu = cpu
+                p.mem = mem
+                rows.append(r)
+        self._changed(rows, COL_CPU, COL_MEM)
+
+
+class ProcessFilterProxy(QSortFilterProxyModel):
+    """search box filter (pid / name / user like ProcessUtil.matches) plus sorting on the raw values"""
+
+    def __init__(self, matches, parent=None):
+        super().__init__(parent)
+        self._matches = matches
+        self._query = ""
+        self.setSortRole(Qt.ItemDataRole.UserRole)
+        self.setDynamicSortFilter(True)
+
+    def set_query(self, qry: str):
+        qry = qry.lower().strip()
+        if qry == self._query:
+            return
+        self._query = qry
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._query:
+            return True
+        return self._matches(self.sourceModel().process(source_row), self._query)
@@ -0,0 +1,102 @@
+import os
+import hashlib
+import numpy as np
+
+"""
+on disk detector baselines, one file per executable
+so a new session for the same binary starts with warm windows instead of learning from zero
+
+the format is just named arrays:
+    header    magic, format version, section count
+    sections  name, dtype, shape and offset of every array
+    data      the raw arrays, each 64 byte aligned
+so reading is one mmap and a view per section, nothing gets parsed
+bump profile_version whenever what gets stored changes, old files are then ignored
+"""
+
+profile_dir = os.path.expanduser("~/.cache/syscall-mon/profiles")
+profile_version = 1
+_magic = b"SYSMONPF"
+_align = 64
+
+_header_dtype = np.dtype([("magic", "S8"), ("version", "<u4"), ("count", "<u4")])
+_section_dtype = np.dtype([
+    ("name", "S24"),
+    ("dtype", "S8"),
+    ("rows", "<u8"),
+    ("cols", "<u8"), #0 for 1d arrays
+    ("offset", "<u8"),
+])
+
+
+def exe_of(pid: int):
+    """executable path of a pid, None if its gone or we cant see it"""
+    try:
+        return os.readlink(f"/proc/{pid}/exe")
+    except OSError:
+        return None
+
+
+def profile_path(exe: str) -> str:
+    """profiles are named after the binary plus a hash of the full path so same named binaries dont clash"""
+    key = hashlib.sha1(exe.encode()).hexdigest()[:16]
+    return os.path.join(profile_dir, f"{os.path.basename(exe) or 'unknown'}-{key}.prof")
+
+
+def _aligned(n: int) -> int:
+    return (n + _align - 1) // _align * _align
+
+
+def write_profile(path: str, arrays: dict):
+    """write named 1d/2d arrays as a profile, through a tmp file + rename so readers never see half a file"""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    table = np.zeros(len(arrays), dtype=_section_dtype)
+
+    offset = _aligned(_header_dtype.itemsize + table.nbytes)
+    for i, (name, a) in enumerate(arrays.items()):
+        table[i] = (name.encode(), a.dtype.str.encode(), a.shape[0], a.shape[1] if a.ndim == 2 else 0, offset)
+        offset = _aligned(offset + a.nbytes)
+
+    header = np.array([(_magic, profile_version, len(arrays))], dtype=_header_dtype)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+        for row, a in zip(table, arrays.values()):
+            f.seek(int(row["offset"]))
+            f.write(a.tobytes())
+    os.replace(tmp, path)
+
+
+def read_profile(path: str):
+    """
+    map a profile and return {name: read only array backed by the mmap}
+    None if theres no profile, its from another format version or its truncated
+    """
+    try:
+        buf = np.memmap(path, dtype=np.uint8, mode="r")
+    except (OSError, ValueError): #missing or empty
+        return None
+    if len(buf) < _header_dtype.itemsize:
+        return None
+
+    header = np.frombuffer(buf, dtype=_header_dtype, count=1)[0]
+    if header["magic"] != _magic or header["version"] != profile_version:
+        return None
+    count = int(header["count"])
+    if len(buf) < _header_dtype.itemsize + count * _section_dtype.itemsize:
+        return None
+    table = np.frombuffer(buf, dtype=_section_dtype, count=count, offset=_header_dtype.itemsize)
+
+    out = {}
+    for row in table:
+        dt = np.dtype(row["dtype"].decode())
+        rows, cols = int(row["rows"]), int(row["cols"])
+        n = rows * (cols or 1)
+        offset = int(row["offset"])
+        if offset + n * dt.itemsize > len(buf):
+            return None
+        a = np.frombuffer(buf, dtype=dt, count=n, offset=offset)
+        out[row["name"].decode()] = a.reshape(rows, cols) if cols else a
+    return out
@@ -1,56 +1,124 @@
-from bcc import BPF
+import ctypes as ct
+import os
 import time
 import threading
-import queue
-from dataclasses import dataclass
+from abc import ABC, abstractmethod
+from collections import defaultdict
+import numpy as np
 from syscall_helpers import *
-from anomaly_detector import AnomalyDetector
+from batch_queue import BatchQueue
+from anomaly_detector import AnomalyWorker, AnomalyEngine, param_keys
+from profile_store import exe_of
+from trace_log import TraceRecorder
+
+try:
+    from bcc import BPF
+except ImportError: #no bcc, everything but live tracing (replays, benchmarks) still works
+    BPF = None
 
 """
 linux only
 run as root
 """
 
-@dataclass
-class SysCall:
-    pid: int
-    name: str
-    timestamp: float
-    args: dict
-    event_type: SysType.OTHER
-    anomalies: list = None  # Detected anomalies for this syscall
+"""
+transport config
+ringbuf is one buffer shared by all cpus, size is ringbuf_pages * 4kb (has to be a power of 2)
+perf buffer is perf_pages * 4kb per cpu
+records get copied into a preallocated batch and processed batch_size at a time
+"""
+ringbuf_pages = 1024
+perf_pages = 64
+batch_size = 4096
+
+#same layout as struct syscall_evt in syscall_tracer.c, align=True gives the same padding as C
+evt_dtype = np.dtype([
+    ("pid", np.uint32),
+    ("id", np.uint64),
+    ("args", np.uint64, (6,)),
+], align=True)
+
+evt_size = evt_dtype.itemsize #64, u32 pid gets padded to 8
+
 
+def ringbuf_supported():
+    """BPF_RINGBUF_OUTPUT needs linux 5.8+"""
+    try:
+        major, minor = os.uname().release.split(".")[:2]
+        return (int(major), int(minor)) >= (5, 8)
+    except ValueError:
+        return False
 
-class SysTracer:
+
+class EventPipeline(ABC):
     """
-    SysTracer
+    everything that happens to events once theyre in userspace, shared by SysTracer and TraceReplay
+    pid filtering, categorizing, handing raw batches to the anomaly worker, SysCall batches
+    for the ui (thread-safe batch queue, one lock per batch not per event) and trace recording
+    anomalies come back from the worker on self.anomalies
 
-    attaches an eBPF program that traces syscalls
-    filters by pid
-    parses syscall names and arguments
-    pushes processed events into a thread-safe queue
+    subclasses feed decoded batches (pid / id / args fields) into _dispatch from their _run thread
+    and hook the kernel side into track_pid, set_filter, set_sample_rate and stop
+
+    aggregate: per category counts arrive from somewhere else (kernel counters), otherwise every batch is counted
+    engine: "thread" (one AnomalyWorker) or "process" (AnomalyEngine, pids sharded over a process pool)
+    profiles: warm start detectors from (and save them to) per executable profiles
+    analyze_interval: seconds between detector runs on the worker
+
+    the sequence detector learns from the stream after the capture filter (a category filtered in kernel
+    never reaches userspace, sending everything up just to learn from it would undo the kernel filter)
+    whenever events go missing (kernel drops, capture filter or sample rate changes) the next batch of every
+    pid is marked as a gap so no transition is learned across the hole
     """
 
-    def __init__(self, pid):
+    transport = "none"
+    stream_clock = False #True: detection runs on the batch timestamps (recorded traces) instead of the wall clock
+    lossless = False #True: wait for the anomaly worker instead of dropping when its behind
+
+    def __init__(self, pid, aggregate=True, sample_every=1, engine="thread", profiles=True, analyze_interval=0.25):
         self.pid = pid
         self.running = False
+        self.aggregate = aggregate
+        self.profiles = profiles
 
-        #thread safe queueui will pull from this
-        self.events = queue.Queue(maxsize=4096) #max queue size prevent overflows
+        #thread safe batch queue ui will drain this every tick
+        self.events = BatchQueue(maxsize=65536) #max backlog prevent overflows if the ui stalls
 
-        #default filters 
-        self.filters = {
-            "file": True,
-            "net": True,
-            "proc": True,
-            "mem": True,
-            "other": False
-        }
+        #default filters (same defaults as the monitor window checkboxes)
+        self.filters = {st.value: st != SysType.OTHER for st in SysType}
 
-        
-        #this code actually runs in kernel
-        self.bpf = BPF(src_file="syscall_tracer.c") # written in C to give the verifier an easier time (code compiles to bytecode and runs if verified)
-        self.bpf["events"].open_perf_buffer(self._on_event)
+        self.syscall_table = SYSCALL_TABLE #maps id to syscall
+        self._ids_by_category = syscall_ids_by_category() #precomputed once so set_filter is just map writes
+        self._enabled_ids = np.zeros(max_syscalls, dtype=bool) #userspace copy of the category filter
+
+        #id -> category index and id -> has detector relevant args, as arrays so a whole batch is one lookup
+        self._category_codes = np.array(CATEGORY_CODES, dtype=np.uint8)
+        self._param_ids = np.zeros(max_syscalls, dtype=bool)
+        for sid, name in self.syscall_table.items():
+            if sid < max_syscalls and any(k in SIGNATURES.get(name, ()) for k in param_keys):
+                self._param_ids[sid] = True
+
+        #throughput and loss
+        self.received = 0
+        self._seq_gaps = set() #pids whose next batch follows lost events
+        self._last_dropped = 0 #kernel drops seen so far
+        self.recorder = None #TraceRecorder while recording to a trace log
+        self._last_stats = (time.time(), 0)
+
+        #anomaly detection on its own thread, counts always arrive through ingest_counts (kernel counters or per batch bincount)
+        self.engine = engine
+        self.analyze_interval = analyze_interval # analyze every 250ms by default
+        self.anomaly_worker = self._make_worker(engine)
+        self.anomalies = self.anomaly_worker.anomalies #separate channel from events, survives set_engine
+
+        self.pids = set()
+        self.exes = {} #pid: executable path, profiles are loaded/saved per executable
+        self._pid_array = np.zeros(0, dtype=np.uint32)
+        self.track_pid(pid)
+
+        for name, val in self.filters.items(): #push defaults (into the kernel too for SysTracer)
+            self.set_filter(name, val)
+        self.set_sample_rate(sample_every)
 
         #worker thread not qt thread
         self._thread = threading.Thread(
@@ -58,100 +126,377 @@ class SysTracer:
             daemon=True
         )
 
-        self.syscall_table = load_syscall_table() #maps id to syscall
- 
-        #eally wanna avoid lag so we will rate limit
-        self._last_emit = 0.0
-        self._emit_interval = 0.01 #100 events per sec max per pid
+    def _make_worker(self, engine, anomalies=None):
+        if engine == "process":
+            return AnomalyEngine(analyze_interval=self.analyze_interval, anomalies=anomalies, lossless=self.lossless)
+        return AnomalyWorker(analyze_interval=self.analyze_interval, anomalies=anomalies, lossless=self.lossless)
+
+    def set_engine(self, engine):
+        """
+        swap the anomaly worker for the other kind ("thread" / "process") without stopping the trace
+        what every pid learned moves over as profile arrays, the anomalies channel stays the same
+        """
+        if engine == self.engine:
+            return
+        old = self.anomaly_worker
+        new = self._make_worker(engine, old.anomalies)
+        new.set_sensitivity(old.detector.sensitivity)
+        if self.running:
+            new.start()
+        self.anomaly_worker = new #the poll thread uses this from its next batch on
+        self.engine = engine
+        self._seq_gaps = set(self.pids) #whatever was still going to the old one is lost
+        for pid, arrays in old.handover().items():
+            if pid in self.pids:
+                new.apply_state(pid, arrays)
+
+    def track_pid(self, pid):
+        """start following a tgid"""
+        self.pids.add(pid)
+        self._pid_array = np.array(sorted(self.pids), dtype=np.uint32)
 
-        #anomaly detection
-        self.anomaly_detector = AnomalyDetector()
+        self.exes[pid] = exe_of(pid) if self.profiles else None
+        if self.running and self.exes[pid]: #otherwise start() loads it once the worker is up
+            self.anomaly_worker.load_profile(pid, self.exes[pid])
 
-        self._last_analyze = time.time()
-        self._analyze_interval = 0.25  # analyze every 250ms
+    def untrack_pid(self, pid):
+        """stop following a tgid (process exited or tab closed)"""
+        self.pids.discard(pid)
+        exe = self.exes.pop(pid, None)
+        if exe:
+            self.anomaly_worker.save_profile(pid, exe)
+        self.anomaly_worker.clear_process(pid)
+        self._pid_array = np.array(sorted(self.pids), dtype=np.uint32)
 
     def set_filter(self, name, val):
+        """enable or disable a category, name is the SysType value. returns the SysType or None"""
+        try:
+            cat = SysType(name)
+        except ValueError:
+            return None
+        if self.filters.get(name) != val:
+            self._seq_gaps = set(self.pids) #the stream changes shape here, dont join across it
         self.filters[name] = val
+        self._enabled_ids[self._ids_by_category[cat]] = bool(val)
+        return cat
+
+    def set_sample_rate(self, every):
+        """only pass 1 in every events to the detailed stream"""
+        every = max(1, int(every))
+        if every != getattr(self, "sample_every", every):
+            self._seq_gaps = set(self.pids)
+        self.sample_every = every
+
+    def get_syscall_counts(self):
+        """total count of each syscall since tracing started {(pid, name): count}, needs kernel counters"""
+        return {}
 
-    def _on_event(self, cpu, data, size):
-        """perf buffer callback"""
+    def _dispatch(self, b, now):
+        """
+        one decoded batch in, b can be a view into a buffer the caller reuses
+        the batch is a structured array so pid filtering, categorizing and counting
+        are whole batch numpy ops, only events that get displayed become SysCall objects
+        """
+        self.received += len(b)
         try:
-            now = time.time() #ratelimit
-            if now - self._last_emit < self._emit_interval:
-                return
-            self._last_emit = now
-
-            evt = self.bpf["events"].event(data)
-            if evt.pid != self.pid: #only for our pid
-                return
-                 
-            name = self.syscall_table.get(evt.id)
-            if not name:
-                name = f"sys_{evt.id}"
-
-            raw_args = tuple(evt.args)
-
-            parsed_args = parse_syscall_args(name, raw_args)
-            cat = syscall_category(name)
-            sc = SysCall(
-                pid=evt.pid,
-                name=name,
-                timestamp=now,
-                args=parsed_args,
-                event_type=cat
-            )
-
-            #anomaly detection
-            self.anomaly_detector.ingest_syscall(
-                evt.pid,
-                name,
-                cat,
-                parsed_args
-            )
-
-            #run batch analysis occasionally
-            if now - self._last_analyze >= self._analyze_interval:
-                batch_anomalies = self.anomaly_detector.analyze_batch()
-                self._last_analyze = now
-                #attach anomalies that belong to this pid
-                sc.anomalies = [
-                    a for a in batch_anomalies if a.pid == evt.pid
-                ]
+            dropped = self._dropped_kernel()
+            if dropped != self._last_dropped: #kernel lost events since the last batch, no telling whose
+                self._last_dropped = dropped
+                self._seq_gaps = set(self.pids)
 
-            try:
-                self.events.put_nowait(sc) #try add to queue 
-            except queue.Full:
-                pass
+            keep = np.isin(b["pid"], self._pid_array) #kernel already filters, this catches untracked pids still in flight
+            if not keep.all():
+                b = b[keep]
 
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.write(b, now) #copies, the writer thread does the rest
+            self._process(b, now)
         except Exception as e:
             print(f"[event error] {e}")
 
+    def _process(self, b, now):
+        ids = np.minimum(b["id"], max_syscalls - 1) #out of range ids land on an unused slot (OTHER)
+        codes = self._category_codes[ids]
+        pids = b["pid"]
+        gaps = self._seq_gaps
+        if self.stream_clock: #ahead of the batch, so anything due before it gets analyzed without it
+            self.anomaly_worker.set_clock(now)
+
+        for pid in np.unique(pids).tolist():
+            sel = pids == pid
+            p_ids = ids[sel]
+
+            if not self.aggregate: #no kernel counters, count the batch instead
+                counts = np.bincount(codes[sel], minlength=len(SYSTYPES))
+                self.anomaly_worker.submit_counts(pid, {
+                    SYSTYPES[c]: int(counts[c]) for c in np.flatnonzero(counts)
+                })
+
+            #only syscalls with fd/size style args feed the parameter detector
+            #boolean indexing copies so the worker owns these even after the batch buffer is reused
+            #the sequence detector gets every id, but only unsampled, sampled ones arent real transitions
+            rel = self._param_ids[p_ids]
+            seq = p_ids.astype(np.uint16) if self.sample_every == 1 else None
+            gap = pid in gaps
+            if rel.any() or seq is not None or gap:
+                self.anomaly_worker.submit(pid, p_ids[rel], b["args"][sel][rel], seq, gap)
+                gaps.discard(pid)
+
+        #only build objects for what the queue can still hold, newest first
+        room = self.events.room()
+        skipped = 0
+        if room < len(b):
+            skipped = len(b) - room
+            b = b[skipped:]
+
+        out = [
+            SysCall(pid, sid, now, tuple(raw), syscall_category_id(sid)) #args stay raw until someone reads them
+            for pid, sid, raw in zip(b["pid"].tolist(), b["id"].tolist(), b["args"].tolist())
+        ]
+        self.events.put_batch(out, skipped)
+
+    def get_stats(self):
+        """
+        throughput and loss since the last call
+        dropped_kernel: didnt fit in the ring/perf buffer
+        dropped_queue: ui wasnt pulling fast enough
+        backlog: events waiting in the queue, last_drained: how many the ui took last tick
+        """
+        now = time.time()
+        last_t, last_n = self._last_stats
+        self._last_stats = (now, self.received)
+        dt = now - last_t
+
+        return {
+            "transport": self.transport,
+            "received": self.received,
+            "rate": (self.received - last_n) / dt if dt > 0 else 0.0,
+            "dropped_kernel": self._dropped_kernel(),
+            "dropped_queue": self.events.dropped,
+            "backlog": len(self.events),
+            "last_drained": self.events.last_drained,
+            "dropped_analysis": self.anomaly_worker.dropped,
+            "dropped_recording": self.recorder.dropped if self.recorder else 0,
+        }
+
+    def _dropped_kernel(self):
+        return 0
+
+    def start_recording(self, path, compress=False):
+        """
+        stream every event that reaches userspace to a trace log (see trace_log.py)
+        only whats left after the capture filter gets recorded, disabled categories, sampled out
+        events and untracked pids are never in the log
+        """
+        self.stop_recording()
+        recorder = TraceRecorder(path, compress=compress)
+        recorder.start()
+        self.recorder = recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
     def start(self):
-        """start tracing thread"""
+        """start the worker and the event thread"""
         if self.running:
             return
         self.running = True
+        self.anomaly_worker.start()
+        for pid, exe in self.exes.items(): #warm start from whatever earlier sessions learned
+            if exe:
+                self.anomaly_worker.load_profile(pid, exe)
         self._thread.start()
 
+    @abstractmethod
     def _run(self):
-        """poll perf buffer"""
+        """the event thread, reads batches from the source and hands them to _dispatch until running goes false"""
+
+    def stop(self):
+        """stop the event thread, save profiles, stop the worker and any recording"""
+        if not self.running:
+            return
+        self.running = False
+        for pid, exe in self.exes.items(): #keep what was learned for next time
+            if exe:
+                self.anomaly_worker.save_profile(pid, exe)
+        self.anomaly_worker.stop()
+        self.stop_recording()
+
+    def get_anomaly_detector(self):
+        """get the anomaly detector for this tracer (with the process engine, a copy pulled from the workers)"""
+        return self.anomaly_worker.get_detector()
+
+    def set_detection_sensitivity(self, sensitivity: float):
+        self.anomaly_worker.set_sensitivity(sensitivity)
+
+
+class SysTracer(EventPipeline):
+    """
+    SysTracer
+
+    attaches an eBPF program that traces syscalls
+    filters by pid in kernel (tracked_pids map) so other processes never reach us
+    filters by category in kernel (enabled_ids map) so unticked categories are never submitted
+    everything after the ring/perf buffer is EventPipeline
+    one tracer can follow many pids (track_pid), they all share the one bpf program
+
+    aggregate: kernel keeps exact per pid per syscall counters that we read once per
+    count_interval and feed to the frequency detector, the detailed event stream
+    is then free to be sampled (1 in sample_every) without breaking frequency stats
+    arg_hist: also keep a log2 histogram of args[2] per syscall in kernel
+    transport: "ringbuf", "perf" or "auto" (ringbuf when the kernel has it)
+    engine: "thread" (one AnomalyWorker) or "process" (AnomalyEngine, pids sharded over a process pool)
+    """
+
+    def __init__(self, pid, aggregate=True, sample_every=1, arg_hist=False, transport="auto", engine="thread"):
+        if BPF is None:
+            raise RuntimeError("live tracing needs bcc (python3-bpfcc), replay a trace log instead")
+        self.arg_hist = arg_hist
+
+        if transport == "auto":
+            transport = "ringbuf" if ringbuf_supported() else "perf"
+        self.transport = transport
+
+        cflags = [f"-DMAX_SYSCALLS={max_syscalls}"]
+        if arg_hist:
+            cflags.append("-DARG_HIST")
+        if transport == "ringbuf":
+            cflags += ["-DUSE_RINGBUF", f"-DRINGBUF_PAGES={ringbuf_pages}"]
+
+        #this code actually runs in kernel
+        self.bpf = BPF(
+            src_file="syscall_tracer.c", # written in C to give the verifier an easier time (code compiles to bytecode and runs if verified)
+            cflags=cflags
+        )
+
+        #callbacks only copy the record into the batch, everything else happens per batch in _drain
+        self._batch = np.zeros(batch_size, dtype=evt_dtype)
+        self._batch_addr = self._batch.ctypes.data
+        self._batch_len = 0
+        if transport == "ringbuf":
+            self.bpf["events"].open_ring_buffer(self._on_record)
+        else:
+            self.bpf["events"].open_perf_buffer(self._on_record, page_cnt=perf_pages)
+
+        #exact counters, we keep the last totals and feed the detector the deltas
+        self._prev_counts = {} #(pid, id): total
+        self._last_counts_read = time.time()
+        self._count_interval = 1.0 #FrequencyDetector ticks from read to read, this sets how often that can be
+
+        super().__init__(pid, aggregate=aggregate, sample_every=sample_every, engine=engine)
+
+    def track_pid(self, pid):
+        """add a tgid to the in kernel filter"""
+        self.bpf["tracked_pids"][ct.c_uint(pid)] = ct.c_ubyte(1)
+        super().track_pid(pid)
+
+    def untrack_pid(self, pid):
+        """stop tracing a tgid (process exited or tab closed)"""
+        try:
+            del self.bpf["tracked_pids"][ct.c_uint(pid)]
+        except KeyError:
+            pass
+        super().untrack_pid(pid)
+
+    def set_filter(self, name, val):
+        """enable or disable a category in kernel, name is the SysType value"""
+        cat = super().set_filter(name, val)
+        if cat is None:
+            return None
+
+        ids = self.bpf["enabled_ids"]
+        flag = ct.c_ubyte(1 if val else 0)
+        for sid in self._ids_by_category[cat]:
+            ids[ct.c_int(sid)] = flag
+        return cat
+
+    def set_sample_rate(self, every):
+        """only send 1 in every events to the detailed stream (in kernel, counters still see everything)"""
+        super().set_sample_rate(every)
+        self.bpf["sample_every"][ct.c_int(0)] = ct.c_uint(self.sample_every)
+
+    def _read_counts(self, now):
+        """
+        read the kernel counters and hand the per category deltas to the frequency detector
+        stamped with the read time, every tracked pid gets one (empty when it was quiet) so its interval ends here
+        """
+        per_pid = defaultdict(lambda: defaultdict(int))
+
+        for k, v in self.bpf["syscall_counts"].items():
+            key = (k.pid, k.id)
+            total = v.value
+            delta = total - self._prev_counts.get(key, 0) #deltas instead of clearing so we never race the probe
+            self._prev_counts[key] = total
+            if delta <= 0:
+                continue
+            cat = syscall_category_id(k.id)
+            per_pid[k.pid][cat] += delta
+
+        for pid in set(self._pid_array.tolist()) | per_pid.keys(): #the array, self.pids changes under us from the qt thread
+            self.anomaly_worker.submit_counts(pid, dict(per_pid[pid]), now)
+
+    def get_syscall_counts(self):
+        """total count of each syscall since tracing started {(pid, name): count}"""
+        out = {}
+        for (pid, sid), total in list(self._prev_counts.items()):
+            out[(pid, syscall_name(sid))] = total
+        return out
+
+    def get_arg_histogram(self):
+        """log2 buckets of args[2] per syscall {name: {slot: count}}, empty unless arg_hist is on"""
+        if not self.arg_hist:
+            return {}
+        out = defaultdict(dict)
+        for k, v in self.bpf["arg_hist"].items():
+            out[syscall_name(k.id)][k.slot] = v.value
+        return dict(out)
+
+    def _on_record(self, ctx, data, size):
+        """ring/perf buffer callback, just copy into the preallocated batch"""
+        ct.memmove(self._batch_addr + self._batch_len * evt_size, data, evt_size)
+        self._batch_len += 1
+        if self._batch_len == batch_size: #full mid poll
+            self._drain()
+
+    def _drain(self):
+        """process everything copied in since the last drain"""
+        n = self._batch_len
+        if not n:
+            return
+        self._batch_len = 0
+        self._dispatch(self._batch[:n], time.time()) #view, no copy
+
+    def _dropped_kernel(self):
+        try:
+            return self.bpf["dropped"].sum(ct.c_int(0)).value
+        except Exception:
+            return 0
+
+    def _run(self):
+        """poll ring/perf buffer and drain whatever came in"""
         while self.running:
             try:
-                self.bpf.perf_buffer_poll(timeout=500)
+                if self.transport == "ringbuf":
+                    self.bpf.ring_buffer_poll(timeout=500)
+                else:
+                    self.bpf.perf_buffer_poll(timeout=500)
+                self._drain()
+
+                #counters are read on this thread too so the buffer never waits on a map read from elsewhere
+                now = time.time()
+                if self.aggregate and now - self._last_counts_read >= self._count_interval:
+                    self._read_counts(now)
+                    self._last_counts_read = now
             except:
                 pass
 
     def stop(self):
         """stop tracing and cleanup"""
-        self.running = False
+        super().stop()
         try:
             self.bpf.cleanup() #detach and free perf buffers
         except:
             pass
-
-    def get_anomaly_detector(self):
-        """get the anomaly detector for this tracer"""
-        return self.anomaly_detector
-
-    def set_detection_sensitivity(self, sensitivity: float):
-        self.anomaly_detector.set_sensitivity(sensitivity)
\ No newline at end of file
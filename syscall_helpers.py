@@ -1,17 +1,24 @@
 import os
 import re
 import json
+import signal
 from enum import Enum
 
 """
 syscall helpers:
 syscall table loader
-syscall categorization
+syscall categorization (resolved once per id into a dense table, lookups are just an index)
+per category id lists for the kernel side filter
+readable arg rendering (signature aware, decoded flags) for the log
+SysCall event type
 
 categories and args from json so this isnt hardcoded shit
 so many dicts luckily theyre are o(1) lookup
 """
 
+max_syscalls = 512 # size of the id keyed bpf maps, x86_64 tops out in the 400s
+
+
 class SysType(Enum):
     """
     FILE_IO    - actual data read write to files
@@ -65,18 +72,45 @@ def load_category_dict(path="!syscall_categories.json"):
 
 CATEGORIES = load_category_dict() #global
 
+#every (prefix, category) longest first, so readlink hits "readlink" before "read" no matter the json order
+_PREFIXES = sorted(
+    ((p, cat) for cat, ls in CATEGORIES.items() for p in ls),
+    key=lambda x: len(x[0]),
+    reverse=True
+)
+
+
+def _match_category(name:str) -> SysType:
+    """longest prefix wins, only used while building the tables (and for names we dont know)"""
+    for prefix, category in _PREFIXES:
+        if name.startswith(prefix):
+            return category
+    return SysType.OTHER
+
 
 def syscall_category(name:str) -> SysType:
     """
     basic categorization
     prefix based for less specific resutls
+    known syscalls are precomputed, only unknown names fall back to a prefix scan
     """
-    for category, prefixes in CATEGORIES.items():
-        if name.startswith(prefixes):
-            return category
+    cat = _CATEGORY_BY_NAME.get(name)
+    if cat is None:
+        return _match_category(name)
+    return cat
+
+
+def syscall_category_id(sid:int) -> SysType:
+    """o(1) categorization straight from the syscall number (what the tracer, detector and ui should use)"""
+    if 0 <= sid < max_syscalls:
+        return CATEGORY_BY_ID[sid]
     return SysType.OTHER
 
 
+def syscall_name(sid:int) -> str:
+    return SYSCALL_TABLE.get(sid) or f"sys_{sid}"
+
+
 def load_syscall_signatures(path="!syscall_signatures.json"):
     """parse raw syscall args into named args based on the json"""
     if not os.path.exists(path):
@@ -104,6 +138,182 @@ def parse_syscall_args(name:str, args:tuple):
     return parsed
 
 
+"""
+readable arg rendering for the log
+each arg gets a renderer picked from its name in the signature json (and the syscall, flags mean diff things per call)
+fds and other ints signed, pointers hex, flags/enums decoded to names, sizes plain
+renderers are worked out once per syscall and cached, and nothing here runs until a row is actually shown / exported
+"""
+
+_FD_ARGS = {"fd", "dirfd", "sockfd", "epfd"}
+_INT_ARGS = {
+    "pid", "tgid", "pgid", "sig", "status", "uid", "gid", "ruid", "euid", "suid", "timeout", "maxevents", "nfds",
+    "cmd", "option", "operation", "key", "shmid", "msqid", "semid", "nsems", "nsops", "msgtyp", "which", "timerid", "protocol",
+}
+_SIZE_ARGS = {"count", "len", "length", "size", "bufsiz", "msgsz", "old_size", "new_size", "offset", "mask", "addrlen"}
+_PTR_OVERRIDES = {("wait4", "status"), ("accept", "addrlen"), ("recvfrom", "addrlen"), ("timer_create", "timerid")}
+
+AT_FDCWD = -100
+
+_OPEN_FLAGS = [
+    (0o100, "O_CREAT"), (0o200, "O_EXCL"), (0o400, "O_NOCTTY"), (0o1000, "O_TRUNC"), (0o2000, "O_APPEND"),
+    (0o4000, "O_NONBLOCK"), (0o4010000, "O_SYNC"), (0o10000, "O_DSYNC"), (0o40000, "O_DIRECT"), (0o100000, "O_LARGEFILE"),
+    (0o20200000, "O_TMPFILE"), (0o200000, "O_DIRECTORY"), (0o400000, "O_NOFOLLOW"), (0o1000000, "O_NOATIME"),
+    (0o2000000, "O_CLOEXEC"), (0o10000000, "O_PATH"),
+]
+_PROT_FLAGS = [(1, "PROT_READ"), (2, "PROT_WRITE"), (4, "PROT_EXEC")]
+_MMAP_FLAGS = [
+    (0x01, "MAP_SHARED"), (0x02, "MAP_PRIVATE"), (0x10, "MAP_FIXED"), (0x20, "MAP_ANONYMOUS"), (0x100, "MAP_GROWSDOWN"),
+    (0x800, "MAP_DENYWRITE"), (0x1000, "MAP_EXECUTABLE"), (0x2000, "MAP_LOCKED"), (0x4000, "MAP_NORESERVE"),
+    (0x8000, "MAP_POPULATE"), (0x10000, "MAP_NONBLOCK"), (0x20000, "MAP_STACK"), (0x40000, "MAP_HUGETLB"),
+    (0x100000, "MAP_FIXED_NOREPLACE"),
+]
+_MREMAP_FLAGS = [(1, "MREMAP_MAYMOVE"), (2, "MREMAP_FIXED"), (4, "MREMAP_DONTUNMAP")]
+_CLONE_FLAGS = [
+    (0x100, "CLONE_VM"), (0x200, "CLONE_FS"), (0x400, "CLONE_FILES"), (0x800, "CLONE_SIGHAND"), (0x2000, "CLONE_PTRACE"),
+    (0x4000, "CLONE_VFORK"), (0x8000, "CLONE_PARENT"), (0x10000, "CLONE_THREAD"), (0x20000, "CLONE_NEWNS"),
+    (0x40000, "CLONE_SYSVSEM"), (0x80000, "CLONE_SETTLS"), (0x100000, "CLONE_PARENT_SETTID"),
+    (0x200000, "CLONE_CHILD_CLEARTID"), (0x1000000, "CLONE_CHILD_SETTID"), (0x2000000, "CLONE_NEWCGROUP"),
+    (0x4000000, "CLONE_NEWUTS"), (0x8000000, "CLONE_NEWIPC"), (0x10000000, "CLONE_NEWUSER"),
+    (0x20000000, "CLONE_NEWPID"), (0x40000000, "CLONE_NEWNET"),
+]
+_AT_FLAGS = [(0x100, "AT_SYMLINK_NOFOLLOW"), (0x800, "AT_NO_AUTOMOUNT"), (0x1000, "AT_EMPTY_PATH")]
+_MSG_FLAGS = [
+    (0x1, "MSG_OOB"), (0x2, "MSG_PEEK"), (0x4, "MSG_DONTROUTE"), (0x20, "MSG_TRUNC"), (0x40, "MSG_DONTWAIT"),
+    (0x80, "MSG_EOR"), (0x100, "MSG_WAITALL"), (0x4000, "MSG_NOSIGNAL"), (0x8000, "MSG_MORE"),
+    (0x40000000, "MSG_CMSG_CLOEXEC"),
+]
+_PIPE_FLAGS = [(0o4000, "O_NONBLOCK"), (0o40000, "O_DIRECT"), (0o2000000, "O_CLOEXEC")]
+_SOCK_TYPE_FLAGS = [(0o4000, "SOCK_NONBLOCK"), (0o2000000, "SOCK_CLOEXEC")]
+_ACCESS_FLAGS = [(4, "R_OK"), (2, "W_OK"), (1, "X_OK")]
+
+_WHENCE = {0: "SEEK_SET", 1: "SEEK_CUR", 2: "SEEK_END", 3: "SEEK_DATA", 4: "SEEK_HOLE"}
+_ACCMODE = {0: "O_RDONLY", 1: "O_WRONLY", 2: "O_RDWR"}
+_SOCK_TYPES = {1: "SOCK_STREAM", 2: "SOCK_DGRAM", 3: "SOCK_RAW", 5: "SOCK_SEQPACKET"}
+_DOMAINS = {1: "AF_UNIX", 2: "AF_INET", 10: "AF_INET6", 16: "AF_NETLINK", 17: "AF_PACKET"}
+_CLOCKS = {
+    0: "CLOCK_REALTIME", 1: "CLOCK_MONOTONIC", 2: "CLOCK_PROCESS_CPUTIME_ID", 3: "CLOCK_THREAD_CPUTIME_ID",
+    4: "CLOCK_MONOTONIC_RAW", 5: "CLOCK_REALTIME_COARSE", 6: "CLOCK_MONOTONIC_COARSE", 7: "CLOCK_BOOTTIME",
+}
+
+
+def _s32(v:int) -> int:
+    v &= 0xffffffff
+    return v - (1 << 32) if v & 0x80000000 else v
+
+
+def _s64(v:int) -> int:
+    return v - (1 << 64) if v & (1 << 63) else v
+
+
+def _flags(v:int, table, zero="0") -> str:
+    """bits -> A|B|0x..., whatever isnt in the table stays as hex at the end"""
+    names = []
+    for bit, name in table:
+        if v & bit == bit:
+            names.append(name)
+            v &= ~bit
+    if v:
+        names.append(hex(v))
+    return "|".join(names) or zero
+
+
+def _enum(table, signed=_s32):
+    return lambda v: table.get(signed(v)) or str(signed(v))
+
+
+def _fd(v:int) -> str:
+    v = _s32(v)
+    return "AT_FDCWD" if v == AT_FDCWD else str(v)
+
+
+def _ptr(v:int) -> str:
+    return hex(v) if v else "NULL"
+
+
+def _open_flags(v:int) -> str:
+    acc = _ACCMODE.get(v & 3, "O_ACCMODE")
+    rest = _flags(v & ~3, _OPEN_FLAGS, zero="")
+    return f"{acc}|{rest}" if rest else acc
+
+
+def _sock_type(v:int) -> str:
+    base = _SOCK_TYPES.get(v & 0xf) or str(v & 0xf)
+    rest = _flags(v & ~0xf, _SOCK_TYPE_FLAGS, zero="")
+    return f"{base}|{rest}" if rest else base
+
+
+def _clone_flags(v:int) -> str:
+    sig = v & 0xff #low byte is the exit signal
+    rest = _flags(v & ~0xff, _CLONE_FLAGS, zero="")
+    sig = _signal_name(sig) if sig else ""
+    return "|".join(p for p in (rest, sig) if p) or "0"
+
+
+def _signal_name(v:int) -> str:
+    v = _s32(v)
+    try:
+        return signal.Signals(v).name
+    except ValueError:
+        return str(v)
+
+
+_FLAG_RENDERERS = {
+    ("open", "flags"): _open_flags,
+    ("openat", "flags"): _open_flags,
+    ("statx", "flags"): lambda v: _flags(v, _AT_FLAGS),
+    ("mmap", "prot"): lambda v: _flags(v, _PROT_FLAGS, zero="PROT_NONE"),
+    ("mprotect", "prot"): lambda v: _flags(v, _PROT_FLAGS, zero="PROT_NONE"),
+    ("mmap", "flags"): lambda v: _flags(v, _MMAP_FLAGS),
+    ("mremap", "flags"): lambda v: _flags(v, _MREMAP_FLAGS),
+    ("clone", "flags"): _clone_flags,
+    ("pipe2", "flags"): lambda v: _flags(v, _PIPE_FLAGS),
+    ("access", "mode"): lambda v: _flags(v, _ACCESS_FLAGS, zero="F_OK"),
+    ("lseek", "whence"): _enum(_WHENCE),
+    ("socket", "domain"): _enum(_DOMAINS),
+    ("socketpair", "domain"): _enum(_DOMAINS),
+    ("socket", "type"): _sock_type,
+    ("socketpair", "type"): _sock_type,
+    ("kill", "sig"): _signal_name,
+    ("tgkill", "sig"): _signal_name,
+    ("clock_gettime", "clk_id"): _enum(_CLOCKS),
+    ("clock_nanosleep", "clk_id"): _enum(_CLOCKS),
+    ("timer_create", "clockid"): _enum(_CLOCKS),
+}
+for _name in ("sendto", "recvfrom", "sendmsg", "recvmsg"):
+    _FLAG_RENDERERS[(_name, "flags")] = lambda v: _flags(v, _MSG_FLAGS)
+
+
+def _arg_renderer(name:str, arg:str):
+    fn = _FLAG_RENDERERS.get((name, arg))
+    if fn:
+        return fn
+    if (name, arg) in _PTR_OVERRIDES:
+        return _ptr
+    if arg in _FD_ARGS:
+        return _fd
+    if arg == "mode":
+        return oct
+    if arg in _INT_ARGS:
+        return lambda v: str(_s32(v))
+    if arg in _SIZE_ARGS:
+        return lambda v: str(_s64(v))
+    if arg in ("flags", "options") or arg.endswith("flg"):
+        return hex
+    return _ptr #anything else in the json is a pointer (paths, buffers, structs)
+
+
+_RENDERERS = {} #syscall name -> [(argname, renderer)], filled as syscalls get shown
+
+
+def format_syscall_args(name:str, args:tuple) -> str:
+    """raw args -> 'fd=3, buf=0x7ffd..., count=4096' using the signature json, '' if theres no signature"""
+    r = _RENDERERS.get(name)
+    if r is None:
+        r = _RENDERERS[name] = [(arg, _arg_renderer(name, arg)) for arg in SIGNATURES.get(name) or ()]
+    return ", ".join(f"{arg}={fn(v)}" for (arg, fn), v in zip(r, args))
+
+
 def load_syscall_table():
     """
     syscall table will be done manually
@@ -127,4 +337,65 @@ def load_syscall_table():
                     name, num = m.groups()
                     table[int(num)] = name
         break
-    return table
\ No newline at end of file
+    return table
+
+
+SYSCALL_TABLE = load_syscall_table() #global id -> name
+
+"""
+dense lookup tables built once at import
+CATEGORY_BY_ID[sid] -> SysType, ids missing from the table are OTHER
+CATEGORY_CODES[sid] -> index into SYSTYPES (for numpy lookups over whole batches)
+"""
+SYSTYPES = list(SysType)
+_CATEGORY_BY_NAME = {name: _match_category(name) for name in SYSCALL_TABLE.values()}
+CATEGORY_BY_ID = [SysType.OTHER] * max_syscalls
+for _sid, _name in SYSCALL_TABLE.items():
+    if 0 <= _sid < max_syscalls:
+        CATEGORY_BY_ID[_sid] = _CATEGORY_BY_NAME[_name]
+CATEGORY_CODES = [SYSTYPES.index(c) for c in CATEGORY_BY_ID]
+
+
+def syscall_ids_by_category():
+    """
+    group every syscall id into its category
+    used to fill the kernel filter array so toggling a category is just flipping its ids
+    """
+    out = {st: [] for st in SysType}
+    for sid, cat in enumerate(CATEGORY_BY_ID):
+        out[cat].append(sid)
+    return out
+
+
+_unparsed = object() #parse_syscall_args can return None so we need our own marker
+
+
+class SysCall:
+    """
+    single syscall event
+    thousands of these sit in the queue and the ui buffers so its kept small:
+    slots instead of a __dict__ and the raw 6 arg tuple instead of a dict,
+    name and the named args dict are only worked out when something reads them
+    """
+    __slots__ = ("pid", "sid", "timestamp", "raw_args", "event_type", "_args")
+
+    def __init__(self, pid:int, sid:int, timestamp:float, raw_args:tuple, event_type:SysType):
+        self.pid = pid
+        self.sid = sid
+        self.timestamp = timestamp
+        self.raw_args = raw_args
+        self.event_type = event_type
+        self._args = _unparsed
+
+    @property
+    def name(self) -> str:
+        return syscall_name(self.sid)
+
+    @property
+    def args(self):
+        if self._args is _unparsed:
+            self._args = parse_syscall_args(self.name, self.raw_args)
+        return self._args
+
+    def __repr__(self):
+        return f"SysCall(pid={self.pid}, name={self.name}, timestamp={self.timestamp}, args={self.args}, event_type={self.event_type})"
@@ -0,0 +1,266 @@
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt6.QtGui import QColor
+from PyQt6.QtWidgets import QListView, QAbstractItemView
+from datetime import datetime
+import numpy as np
+
+from syscall_helpers import SYSTYPES, CATEGORY_CODES, max_syscalls, syscall_name, format_syscall_args
+
+"""
+virtualized syscall log for the monitor tabs
+events are kept as compact columns in a fixed size numpy ring and only rows that are
+actually on screen (or exported) get formatted, so appends and evictions are o(1) no matter how much scrollback
+every captured event is kept, the show filter is just an index over them so it works retroactively
+"""
+
+log_dtype = np.dtype([
+    ("ts", "<f8"),
+    ("sid", "<u4"),
+    ("cat", "u1"), #index into SYSTYPES
+    ("args", "<u8", (6,)),
+]) #61 bytes, 1m events is ~60mb
+
+ts_cache_size = 4096 # seconds worth of HH:MM:SS strings kept around
+export_chunk = 10000 # rows formatted per write when exporting
+
+_ts_cache = {}
+
+
+def format_ts(ts: float) -> str:
+    """HH:MM:SS.mmm, the strftime part only runs once per second of log"""
+    sec = int(ts)
+    s = _ts_cache.get(sec)
+    if s is None:
+        if len(_ts_cache) >= ts_cache_size:
+            _ts_cache.clear()
+        s = _ts_cache[sec] = datetime.fromtimestamp(sec).strftime("%H:%M:%S")
+    return f"{s}.{int((ts - sec) * 1000):03d}"
+
+
+def to_records(evts) -> np.ndarray:
+    """SysCall objects -> log records, args stay raw"""
+    rec = np.empty(len(evts), dtype=log_dtype)
+    sids = [e.sid for e in evts]
+    rec["ts"] = [e.timestamp for e in evts]
+    rec["sid"] = sids
+    rec["cat"] = np.array(CATEGORY_CODES, dtype=np.uint8)[np.minimum(sids, max_syscalls - 1)]
+    rec["args"] = [e.raw_args for e in evts]
+    return rec
+
+
+class EventStore:
+    """
+    columnar ring of events (one array per field) holding everything captured, shown or not
+    events are addressed by sequence number (the nth event ever appended), its slot is seq % capacity,
+    so an index of sequence numbers stays valid while old events get evicted
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        #zeroed pages only get touched as they fill
+        self.ts = np.zeros(capacity, dtype=log_dtype["ts"])
+        self.sid = np.zeros(capacity, dtype=log_dtype["sid"])
+        self.cat = np.zeros(capacity, dtype=log_dtype["cat"])
+        self.args = np.zeros((capacity, 6), dtype=np.uint64)
+        self.first = 0 #seq of the oldest event kept
+        self.end = 0 #seq the next event gets
+
+    def __len__(self):
+        return self.end - self.first
+
+    def room(self) -> int:
+        return self.capacity - len(self)
+
+    def drop_front(self, n: int):
+        self.first += min(n, len(self))
+
+    def _segments(self, lo: int, hi: int):
+        """(slot slice, first seq) pieces covering seqs lo..hi, two when it wraps"""
+        while lo < hi:
+            pos = lo % self.capacity
+            n = min(hi - lo, self.capacity - pos)
+            yield slice(pos, pos + n), lo
+            lo += n
+
+    def append(self, rec):
+        """append log_dtype records, there has to be room (drop_front first)"""
+        i = 0
+        for sl, seq in self._segments(self.end, self.end + len(rec)):
+            j = i + sl.stop - sl.start
+            self.ts[sl] = rec["ts"][i:j]
+            self.sid[sl] = rec["sid"][i:j]
+            self.cat[sl] = rec["cat"][i:j]
+            self.args[sl] = rec["args"][i:j]
+            i = j
+        self.end += len(rec)
+
+    def matching(self, shown) -> np.ndarray:
+        """seqs of every kept event whose category is on in shown (bool per SYSTYPES index)"""
+        parts = [seq + np.flatnonzero(shown[self.cat[sl]]) for sl, seq in self._segments(self.first, self.end)]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def clear(self):
+        self.first = self.end
+
+
+class _SeqIndex:
+    """growable sorted array of seqs with a movable front, dropping evicted seqs is a searchsorted not a copy"""
+
+    def __init__(self, seqs=None):
+        seqs = np.zeros(0, dtype=np.int64) if seqs is None else seqs.astype(np.int64)
+        self.a = np.zeros(max(1024, len(seqs) * 2), dtype=np.int64)
+        self.a[:len(seqs)] = seqs
+        self.lo = 0
+        self.hi = len(seqs)
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    def __getitem__(self, i):
+        return int(self.a[self.lo + i])
+
+    def drop_below(self, seq) -> int:
+        k = int(np.searchsorted(self.a[self.lo:self.hi], seq))
+        self.lo += k
+        return k
+
+    def extend(self, seqs):
+        n = len(seqs)
+        if self.hi + n > len(self.a): #compact, and grow if its still too small
+            live = self.a[self.lo:self.hi]
+            if len(live) + n > len(self.a) // 2:
+                a = np.zeros(max(len(self.a) * 2, (len(live) + n) * 2), dtype=np.int64)
+            else:
+                a = self.a
+            a[:len(live)] = live
+            self.a, self.lo, self.hi = a, 0, len(live)
+        self.a[self.hi:self.hi + n] = seqs
+        self.hi += n
+
+
+class SyscallLogModel(QAbstractListModel):
+    """
+    list model over an EventStore
+    shown picks which categories are visible, toggling one rebuilds the row index from the
+    stored category column (retroactive, nothing has to be traced again)
+    one insert (and at most one remove from the top) per appended batch,
+    lines are only built when the view asks for a row
+    """
+
+    def __init__(self, capacity: int, colors: dict = None, parent=None):
+        super().__init__(parent)
+        self.store = EventStore(capacity)
+        self.shown = np.ones(len(SYSTYPES), dtype=bool)
+        self._index = None #_SeqIndex of visible seqs, None while everything is shown
+        self._colors = {SYSTYPES.index(cat): QColor(col) for cat, col in (colors or {}).items()}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.store) if self._index is None else len(self._index)
+
+    def _slot(self, row: int) -> int:
+        seq = self.store.first + row if self._index is None else self._index[row]
+        return seq % self.store.capacity
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.format_row(index.row())
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return self._colors.get(int(self.store.cat[self._slot(index.row())]))
+        return None
+
+    def format_row(self, r: int) -> str:
+        i = self._slot(r)
+        name = syscall_name(int(self.store.sid[i]))
+        args = format_syscall_args(name, self.store.args[i].tolist())
+        return f"[{format_ts(float(self.store.ts[i]))}] [{SYSTYPES[self.store.cat[i]].name}] {name} ({args})"
+
+    def export(self, path) -> int:
+        """write every visible row (current show filter) to a text file, returns how many"""
+        n = self.rowCount()
+        with open(path, "w") as f:
+            for start in range(0, n, export_chunk):
+                f.write("\n".join(self.format_row(r) for r in range(start, min(start + export_chunk, n))))
+                f.write("\n")
+        return n
+
+    def append(self, rec):
+        """add a batch of records at the bottom, evicting from the top once full"""
+        if not len(rec):
+            return
+        rec = rec[-self.store.capacity:]
+
+        evict = len(rec) - self.store.room()
+        if evict > 0:
+            new_first = self.store.first + evict
+            if self._index is None:
+                gone = evict
+            else:
+                gone = int(np.searchsorted(self._index.a[self._index.lo:self._index.hi], new_first))
+            if gone:
+                self.beginRemoveRows(QModelIndex(), 0, gone - 1)
+            self.store.drop_front(evict)
+            if self._index is not None:
+                self._index.drop_below(new_first)
+            if gone:
+                self.endRemoveRows()
+
+        seq0 = self.store.end
+        if self._index is None:
+            new = len(rec)
+        else:
+            hits = np.flatnonzero(self.shown[rec["cat"]])
+            new = len(hits)
+        rows = self.rowCount()
+        if new:
+            self.beginInsertRows(QModelIndex(), rows, rows + new - 1)
+        self.store.append(rec)
+        if self._index is not None and new:
+            self._index.extend(seq0 + hits)
+        if new:
+            self.endInsertRows()
+
+    def set_shown(self, category, on: bool):
+        """show/hide a category (SysType), applies to everything already stored too"""
+        self.shown[SYSTYPES.index(category)] = on
+        self.beginResetModel()
+        self._index = None if self.shown.all() else _SeqIndex(self.store.matching(self.shown))
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        if self._index is not None:
+            self._index = _SeqIndex()
+        self.endResetModel()
+
+
+class SyscallLogView(QListView):
+    """
+    view for SyscallLogModel
+    uniform row heights so qt never measures more than one row, follows new rows while scrolled to the bottom
+    """
+
+    def __init__(self, model: SyscallLogModel, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setUniformItemSizes(True)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+
+        self._at_bottom = True
+        model.rowsAboutToBeInserted.connect(self._remember_bottom)
+        model.rowsInserted.connect(self._follow)
+        model.modelAboutToBeReset.connect(self._remember_bottom) #refiltering keeps you at the bottom too
+        model.modelReset.connect(self._follow)
+
+    def _remember_bottom(self, *_):
+        sb = self.verticalScrollBar()
+        self._at_bottom = sb.value() >= sb.maximum()
+
+    def _follow(self, *_):
+        if self._at_bottom:
+            self.scrollToBottom()
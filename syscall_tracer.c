@@ -10,23 +10,84 @@ struct syscall_evt { //event we send to user space (mimic our SysCall dataclass)
     u64 args[6]; //raw args
 };
 
+struct count_key { //per pid per syscall counter key
+    u32 pid;
+    u32 id;
+};
+
+#ifdef USE_RINGBUF
+BPF_RINGBUF_OUTPUT(events, RINGBUF_PAGES); //ring buffer (5.8+), one buffer shared by every cpu instead of one per cpu
+#else
 BPF_PERF_OUTPUT(events); //perf buffer
 //perf buffer is efficient way to transfer huge amoutns of events 
 //uses shared memory between kernel and process to quickly let it write and let us read 
+#endif
+
+BPF_PERCPU_ARRAY(dropped, u64, 1); //events that didnt fit in the buffer, percpu so no atomics
+
+BPF_HASH(tracked_pids, u32, u8, 1024); //tgids we care about, filled in from userspace by SysTracer
+//checking here means the rest of the box never gets copied to userspace just to be thrown away
+
+BPF_ARRAY(enabled_ids, u8, MAX_SYSCALLS); //1 if the syscalls category is ticked, SysTracer.set_filter flips these
+
+BPF_HASH(syscall_counts, struct count_key, u64, 10240); //exact counts of every syscall, userspace reads these once per interval
+//counted before the category filter and sampling so frequency stats stay exact no matter what is shown
+
+#ifdef ARG_HIST
+struct hist_key { //log2 histogram of args[2] per syscall (count/len for read write send recv etc)
+    u32 id;
+    u32 slot;
+};
+BPF_HISTOGRAM(arg_hist, struct hist_key, 16384);
+#endif
+
+BPF_ARRAY(sample_every, u32, 1); //only 1 in N events go to the detailed stream, 0/1 means all of them
 
 TRACEPOINT_PROBE(raw_syscalls, sys_enter) // tracepoint is just the callback for when something happens in the kernal (sys_enter is the event)
 {
     struct syscall_evt evt = {};
     u64 pid_tgid = bpf_get_current_pid_tgid();
+    u32 tgid = pid_tgid >> 32; //upper 32 bits are the pid https://docs.ebpf.io/linux/helper-function/bpf_get_current_pid_tgid/
+
+    if (!tracked_pids.lookup(&tgid)) //not ours, bail before doing any work
+        return 0;
+
+    u32 id = args->id;
+    u32 zero = 0;
+
+    struct count_key ck = {.pid = tgid, .id = id};
+    syscall_counts.increment(ck);
 
-    evt.pid = pid_tgid >> 32; //upper 32 bits are the pid https://docs.ebpf.io/linux/helper-function/bpf_get_current_pid_tgid/
-    evt.id  = args->id; //syscall id 
+#ifdef ARG_HIST
+    struct hist_key hk = {.id = id, .slot = bpf_log2l(args->args[2])};
+    arg_hist.increment(hk);
+#endif
+
+    u8 *on = enabled_ids.lookup(&id);
+    if (!on || !*on) //category turned off (or id out of range)
+        return 0;
+
+    u32 *n = sample_every.lookup(&zero);
+    if (n && *n > 1 && bpf_get_prandom_u32() % *n) //sampled out of the detailed stream (still counted above)
+        return 0;
+
+    evt.pid = tgid;
+    evt.id  = id; //syscall id 
 
     #pragma unroll //unroll loop like inline just for ebpf verifier
     for (int i = 0; i < 6; i++) {
         evt.args[i] = args->args[i];
     }
 
-    events.perf_submit(args, &evt, sizeof(evt));
+#ifdef USE_RINGBUF
+    int err = events.ringbuf_output(&evt, sizeof(evt), 0);
+#else
+    int err = events.perf_submit(args, &evt, sizeof(evt));
+#endif
+    if (err) { //buffer full, count it so userspace can report real loss
+        u64 *d = dropped.lookup(&zero);
+        if (d)
+            (*d)++;
+    }
     return 0;
 }
\ No newline at end of file
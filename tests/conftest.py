@@ -0,0 +1,8 @@
+import os
+import sys
+
+#modules sit flat in the repo root and load their json from the cwd
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
@@ -0,0 +1,114 @@
+import queue
+import time
+
+import numpy as np
+
+from anomaly_detector import AnomalyDetector, AnomalyEngine, AnomalyWorker, SysType
+
+empty_args = np.zeros((0, 6), dtype=np.uint64)
+no_ids = np.zeros(0, dtype=np.int64)
+
+
+def test_control_messages_never_block():
+    w = AnomalyWorker()
+    w._inbox = queue.Queue(maxsize=1)
+    w.set_sensitivity(2.0)
+    w.submit_counts(1, {SysType.FILE_IO: 5}) #inbox full, dropped
+    w.clear_process(1)
+    w.load_profile(1, "/bin/true")
+    w.save_profile(1, "/bin/true")
+    assert w.dropped == 5
+    assert w.dropped_control == 3
+    assert w._inbox.get_nowait() == ("sensitivity", 2.0)
+
+
+def test_nothing_goes_out_after_stop():
+    w = AnomalyWorker()
+    w.start()
+    w.stop()
+    w.set_sensitivity(2.0)
+    w.save_profile(1, "/bin/true")
+    assert w._inbox.empty()
+    assert w.dropped_control == 0
+
+
+def _wait_learned(get, pids, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        det = get()
+        if all(pid in det.processes and det.processes[pid]["sequence"].learned for pid in pids):
+            return det
+        time.sleep(0.05)
+    raise AssertionError("nothing learned")
+
+
+def test_engine_detector_has_the_worker_state():
+    e = AnomalyEngine(workers=2, analyze_interval=0.05)
+    e.start()
+    try:
+        for pid in (1, 2):
+            e.submit(pid, no_ids, empty_args, np.array([1, 2, 3], dtype=np.uint16))
+        det = _wait_learned(e.get_detector, (1, 2))
+        assert det.processes[1]["sequence"].learned == 2
+    finally:
+        e.stop()
+
+
+def test_handover_moves_what_was_learned():
+    w = AnomalyWorker(analyze_interval=0.05)
+    w.start()
+    w.submit(1, no_ids, empty_args, np.array([1, 2, 3, 4], dtype=np.uint16))
+    _wait_learned(w.get_detector, (1,))
+    state = w.handover()
+
+    e = AnomalyEngine(workers=1, analyze_interval=0.05, anomalies=w.anomalies)
+    e.start()
+    try:
+        e.apply_state(1, state[1])
+        det = _wait_learned(e.get_detector, (1,))
+        assert det.processes[1]["sequence"].learned == 3
+        assert e.anomalies is w.anomalies
+    finally:
+        e.stop()
+
+
+class SavingDetector(AnomalyDetector):
+    def __init__(self):
+        super().__init__(exact_counts=True)
+        self.saved = []
+
+    def save_profile(self, pid, exe):
+        self.saved.append((pid, exe))
+
+
+def test_saves_that_didnt_fit_go_out_on_stop():
+    det = SavingDetector()
+    w = AnomalyWorker(det)
+    w._inbox = queue.Queue(maxsize=1)
+    w.set_sensitivity(2.0)
+    assert w.save_profile(1, "/bin/true") #kept for stop()
+    w.clear_process(1) #would throw away what the save needs
+    w.start()
+    w.stop()
+    assert det.saved == [(1, "/bin/true")]
+    assert 1 not in w._unsent_saves
+    assert not w.save_profile(1, "/bin/true") #too late, the worker is gone
+
+
+def test_frequency_ticks_follow_the_count_reads():
+    """reads every ~1s with jitter, analysis ticks that see 0 or 2 of them still get the right rate"""
+    det = AnomalyDetector(exact_counts=True)
+    rng = np.random.default_rng(1)
+    found = []
+    for i in range(120):
+        read = 1000.0 + i + rng.uniform(-0.05, 0.05)
+        det.ingest_counts(1, {SysType.FILE_IO: 500}, read)
+        det.clock = 1000.0 + i + 0.02 #analysis tick right around the read, before or after it
+        found.extend(det.analyze_batch())
+        if i % 7 == 0: #and the odd extra tick with no read behind it
+            det.clock += 0.5
+            found.extend(det.analyze_batch())
+
+    assert not [a for a in found if a.anomaly_type == "frequency"]
+    stats = det.processes[1]["frequency"].category_rates[SysType.FILE_IO]
+    assert abs(stats.mean() - 500) < 10
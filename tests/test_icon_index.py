@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import proc_util
+from proc_util import IconIndex, _exec_program
+
+
+def _desktop(path, exec_line, icon):
+    with open(path, "w") as f:
+        f.write(f"[Desktop Entry]\nName=x\nExec={exec_line}\nIcon={icon}\n")
+
+
+def test_wrappers_are_not_the_program():
+    assert _exec_program("/usr/bin/gedit %U") == "/usr/bin/gedit"
+    assert _exec_program("env FOO=1 BAR=2 krita %F") == "krita"
+    assert _exec_program("/usr/bin/flatpak run --branch=stable --command=gnome-calculator org.gnome.Calculator") == "gnome-calculator"
+    assert _exec_program("/usr/bin/flatpak run org.example.App") is None
+    assert _exec_program("env GDK_BACKEND=x11 /usr/bin/flatpak run --command=foo org.example.Foo") == "foo"
+
+
+def test_scan_files_skips_wrappers(tmp_path):
+    _desktop(tmp_path / "a.desktop", "/usr/bin/flatpak run --command=gimp-2.10 org.gimp.GIMP", "org.gimp.GIMP")
+    _desktop(tmp_path / "b.desktop", "/usr/bin/flatpak run org.example.App", "org.example.App")
+    _desktop(tmp_path / "c.desktop", "env FOO=1 krita %F", "krita")
+    index = IconIndex(str(tmp_path / "cache.json"))._scan_files([str(tmp_path)])
+    assert index == {"gimp-2.10": "org.gimp.GIMP", "krita": "krita"}
+
+
+def test_key_covers_subdirs(tmp_path, monkeypatch):
+    apps = tmp_path / "applications"
+    sub = apps / "kde4"
+    sub.mkdir(parents=True)
+    monkeypatch.setattr(proc_util, "_app_dirs", lambda: [str(apps)])
+    icons = IconIndex(str(tmp_path / "cache.json"))
+    before = icons._key()
+    assert str(sub) in before
+
+    _desktop(sub / "new.desktop", "new", "new")
+    os.utime(sub, (before[str(sub)] + 10, before[str(sub)] + 10)) #mtime granularity, dont rely on the clock
+    assert icons._key() != before
+
+
+def test_proc_util_imports_from_any_cwd(tmp_path):
+    #syscall_helpers reads its json from the cwd, proc_util shouldnt need it
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys; sys.path.insert(0, sys.argv[1]); import proc_util; print('syscall_helpers' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code, root], cwd=tmp_path, capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "False"
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+
+from syscall_helpers import SysType, SYSTYPES
+from syscall_log import log_dtype, format_ts, SyscallLogModel
+from monitor_window import MonitorWindow
+
+
+class RecordingTracer:
+    """just enough of the tracer interface for the monitor window, keeps every set_filter call"""
+
+    def __init__(self):
+        self.calls = []
+        self.recorder = None
+
+    def set_filter(self, category, enabled):
+        self.calls.append((category, enabled))
+
+    def start_recording(self, path):
+        self.recorder = path
+
+    def stop_recording(self):
+        self.recorder = None
+
+    def stop(self):
+        pass
+
+    def set_detection_sensitivity(self, sensitivity):
+        pass
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def test_capture_toggle_off_and_back_on(app):
+    win = MonitorWindow()
+    tracer = RecordingTracer()
+    win.open_process((100, "a"), tracer)
+    win.open_process((200, "b"), tracer) #same shared tracer, like main does
+
+    cb = win.sessions[100]["checks"][SysType.NETWORK]
+    other = win.sessions[200]["checks"][SysType.NETWORK]
+    assert cb.isChecked() and other.isChecked()
+
+    cb.setChecked(False)
+    assert tracer.calls == [("network", False)]
+    assert not other.isChecked()
+
+    cb.setChecked(True)
+    assert tracer.calls == [("network", False), ("network", True)]
+    assert other.isChecked()
+
+
+def test_capture_toggle_reaches_every_tracer(app):
+    win = MonitorWindow()
+    a, b = RecordingTracer(), RecordingTracer()
+    win.open_process((100, "a"), a)
+    win.open_process((200, "b"), b)
+
+    cb = win.sessions[200]["checks"][SysType.OTHER] #other starts unchecked
+    cb.setChecked(True)
+    cb.setChecked(False)
+    assert a.calls == b.calls == [("other", True), ("other", False)]
+    assert not win.sessions[100]["checks"][SysType.OTHER].isChecked()
+
+
+def test_show_toggle_is_retroactive(app):
+    win = MonitorWindow()
+    win.open_process((100, "a"), RecordingTracer())
+    session = win.sessions[100]
+    model = session["log"].model()
+
+    rec = np.zeros(4, dtype=log_dtype)
+    rec["cat"] = [SYSTYPES.index(SysType.NETWORK), SYSTYPES.index(SysType.FILE_IO)] * 2
+    model.append(rec)
+    assert model.rowCount() == 4
+
+    session["shown"][SysType.NETWORK].setChecked(False)
+    assert model.rowCount() == 2
+    session["shown"][SysType.NETWORK].setChecked(True)
+    assert model.rowCount() == 4
+
+
+def test_ring_eviction_with_a_show_filter(app):
+    model = SyscallLogModel(8)
+    net, io = SYSTYPES.index(SysType.NETWORK), SYSTYPES.index(SysType.FILE_IO)
+    model.set_shown(SysType.NETWORK, False)
+    rows = [0] #row count as the view sees it, from the insert/remove signals
+    model.rowsInserted.connect(lambda p, a, b: rows.__setitem__(0, rows[0] + b - a + 1))
+    model.rowsRemoved.connect(lambda p, a, b: rows.__setitem__(0, rows[0] - (b - a + 1)))
+
+    cats = []
+    for n in (5, 6, 3, 11): #wraps the ring more than once, the last batch alone is over capacity
+        rec = np.zeros(n, dtype=log_dtype)
+        rec["ts"] = 1000.0 + len(cats) + np.arange(n)
+        rec["cat"] = [net if (len(cats) + i) % 3 == 0 else io for i in range(n)]
+        cats += rec["cat"].tolist()
+        model.append(rec)
+
+        kept = [i for i in range(len(cats))[-8:] if cats[i] == io]
+        assert model.rowCount() == rows[0] == len(kept)
+        for r, i in enumerate(kept):
+            assert model.data(model.index(r)).startswith(f"[{format_ts(1000.0 + i)}] [FILE_IO]")
+
+    model.set_shown(SysType.NETWORK, True)
+    assert model.rowCount() == 8
+    for r, i in enumerate(range(len(cats) - 8, len(cats))):
+        assert model.data(model.index(r)).startswith(f"[{format_ts(1000.0 + i)}]")
+
+
+def test_record_toggle_is_shared_by_the_tracers_tabs(app, monkeypatch):
+    monkeypatch.setattr(QtWidgets.QFileDialog, "getSaveFileName", lambda *a, **k: ("/tmp/x.log", ""))
+    win = MonitorWindow()
+    tracer = RecordingTracer()
+    win.open_process((100, "a"), tracer)
+    win.open_process((200, "b"), tracer)
+
+    win.sessions[100]["record"].click()
+    assert tracer.recorder == "/tmp/x.log"
+    assert win.sessions[200]["record"].isChecked()
+
+    win.sessions[200]["record"].click()
+    assert tracer.recorder is None
+    assert not win.sessions[100]["record"].isChecked()
+
+
+def test_record_button_follows_a_recording_tracer(app):
+    win = MonitorWindow()
+    tracer = RecordingTracer()
+    tracer.start_recording("/tmp/x.log") #main --record starts it before the tab is opened
+    win.open_process((100, "a"), tracer)
+    assert win.sessions[100]["record"].isChecked()
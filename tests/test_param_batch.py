@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pytest
+
+from anomaly_detector import ARG_INDEX, ParameterDetector, param_keys
+from syscall_helpers import parse_syscall_args, syscall_name
+
+has_param = np.zeros(len(ARG_INDEX["fd"]), dtype=bool)
+for key in param_keys:
+    has_param |= ARG_INDEX[key] >= 0
+param_ids = np.flatnonzero(has_param)
+
+
+def _stream(n, seed, values):
+    """ids with fd/size args, every param arg drawn from values(rng, count)"""
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(param_ids, n).astype(np.uint64)
+    args = rng.integers(0, 1 << 16, (n, 6), dtype=np.uint64)
+    for key in param_keys:
+        col = ARG_INDEX[key][ids]
+        rows = np.flatnonzero(col >= 0)
+        args[rows, col[rows]] = values(rng, len(rows))
+    return ids, args
+
+
+def _outliers(base, spread, rate, lo, hi):
+    def values(rng, n):
+        v = base + rng.integers(0, spread, n).astype(np.uint64)
+        out = rng.random(n) < rate
+        v[out] = rng.integers(lo, hi, out.sum(), dtype=np.uint64)
+        return v
+    return values
+
+
+def _bimodal(rng, n):
+    """two far apart clusters, the ref lands in one and the other is all big values"""
+    v = np.where(rng.random(n) < 0.4, np.uint64(1 << 40), np.uint64(4096))
+    return v + rng.integers(0, 50, n).astype(np.uint64)
+
+
+def _spikes(rng, n):
+    """flat line with the odd spike, windows with zero spread"""
+    v = np.full(n, 4096, dtype=np.uint64)
+    v[rng.random(n) < 0.01] = 1 << 33
+    return v
+
+
+streams = {
+    "usual": _outliers(3, 40, 0.002, 1 << 20, 1 << 30),
+    "lots of outliers": _outliers(4000, 200, 0.05, 1 << 20, 1 << 62),
+    "near 2^53": _outliers(1 << 53, 1 << 12, 0.002, 1 << 55, 1 << 60),
+    "near 2^63": _outliers(1 << 63, 1 << 20, 0.002, 1, 1 << 30),
+    "bimodal": _bimodal,
+    "spikes": _spikes,
+}
+
+
+@pytest.mark.parametrize("name", sorted(streams))
+def test_batch_matches_per_event(name):
+    """the batch screen never drops (or adds) an anomaly the per event path reports"""
+    ids, args = _stream(20000, 5, streams[name])
+
+    per_event = ParameterDetector()
+    slow = []
+    for sid, raw in zip(ids.tolist(), args.tolist()):
+        sname = syscall_name(sid)
+        slow.extend(per_event.analyze_args(sname, parse_syscall_args(sname, raw)))
+
+    batched = ParameterDetector()
+    fast = []
+    for i in range(0, len(ids), 1500): #odd batch size so windows straddle batches
+        fast.extend(batched.analyze_batch(ids[i:i + 1500], args[i:i + 1500]))
+
+    assert [a.description for a in fast] == [a.description for a in slow]
+    for a, b in zip(fast, slow):
+        assert math.isclose(a.details["z"], b.details["z"], rel_tol=1e-6)
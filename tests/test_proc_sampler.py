@@ -0,0 +1,43 @@
+import proc_util
+from proc_util import ProcSampler, clk_tck, page_size
+
+
+def _stat(proc, pid, comm, ticks=0, start=100, rss=0):
+    """a /proc/[pid]/stat line, fields after comm numbered like proc(5) minus 3"""
+    f = ["S"] + ["0"] * 49
+    f[11] = str(ticks) #utime, stime stays 0
+    f[19] = str(start)
+    f[21] = str(rss)
+    d = proc / str(pid)
+    d.mkdir(exist_ok=True)
+    (d / "stat").write_bytes(f"{pid} ({comm}) {' '.join(f)}\n".encode())
+
+
+def test_comm_with_spaces_and_parens(tmp_path):
+    _stat(tmp_path, 30, "Web Content", rss=256)
+    _stat(tmp_path, 4, "a) (b", rss=512)
+    _stat(tmp_path, 200, "x ) 1 2 3 (", rss=1024)
+    (tmp_path / "self").mkdir()
+    (tmp_path / "7").mkdir() #exited between listdir and open
+
+    snap = ProcSampler(proc=str(tmp_path)).sample()
+    assert snap.pids.tolist() == [4, 30, 200]
+    assert snap.mem.tolist() == [n * page_size / (1024 * 1024) for n in (512, 256, 1024)]
+    assert snap.cpu.tolist() == [0, 0, 0] #nothing to diff against yet
+
+
+def test_cpu_is_the_delta_for_the_same_process(tmp_path, monkeypatch):
+    clock = iter([1000.0, 1002.0])
+    monkeypatch.setattr(proc_util.time, "time", lambda: next(clock))
+    sampler = ProcSampler(proc=str(tmp_path))
+    _stat(tmp_path, 10, "busy (1)", ticks=0)
+    _stat(tmp_path, 11, "reused", ticks=0, start=100)
+    sampler.sample()
+
+    _stat(tmp_path, 10, "busy (1)", ticks=clk_tck) #one second of cpu over two
+    _stat(tmp_path, 11, "reused", ticks=5 * clk_tck, start=900) #same pid, different process
+    _stat(tmp_path, 12, "new", ticks=clk_tck)
+    snap = sampler.sample()
+    assert snap.pids.tolist() == [10, 11, 12]
+    assert snap.cpu.tolist() == [50.0, 0, 0]
+    assert snap.values()[10] == (50.0, 0.0)
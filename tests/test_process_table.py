@@ -0,0 +1,60 @@
+import pytest
+
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+
+from proc_util import ProcessData
+from process_table import ProcessTableModel, COL_NAME
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def _procs(*pids, names=None):
+    names = names or {}
+    return [ProcessData(pid, names.get(pid, f"p{pid}"), 0.0, "root", "sleeping") for pid in pids]
+
+
+def _names(model):
+    return [model.data(model.index(r, COL_NAME)) for r in range(model.rowCount())]
+
+
+def test_refresh_is_a_diff(app):
+    model = ProcessTableModel()
+    assert model.set_processes(_procs(1, 2, 3, 4, 5, 6)) == [1, 2, 3, 4, 5, 6]
+    model.update_live({3: (12.5, 40.0)})
+    model.process(model.row_of(3)).icon = "icon"
+
+    removed = []
+    model.rowsRemoved.connect(lambda p, a, b: removed.append((a, b)))
+    inserted = []
+    model.rowsInserted.connect(lambda p, a, b: inserted.append((a, b)))
+
+    #2 and 3 go as one run, 5 as another, 4 exec'd into something else, 7 and 8 are new
+    stale = model.set_processes(_procs(1, 4, 6, 7, 8, names={4: "bash"}))
+    assert removed == [(4, 4), (1, 2)] #bottom run first so the top one's rows stay valid
+    assert inserted == [(3, 4)]
+    assert stale == [4, 7, 8]
+    assert _names(model) == ["p1", "bash", "p6", "p7", "p8"]
+    assert [model.row_of(pid) for pid in (1, 4, 6, 7, 8)] == [0, 1, 2, 3, 4]
+    assert model.row_of(2) is None and model.row_of(5) is None
+
+
+def test_unchanged_rows_keep_their_details(app):
+    model = ProcessTableModel()
+    model.set_processes(_procs(10, 11))
+    model.update_live({10: (5.0, 100.0), 11: (1.0, 2.0)})
+    model.update_details([(10, True, "/usr/bin/a"), (11, False, "/usr/bin/b")])
+    model.set_icons({10: "a", 11: "b"})
+
+    changed = []
+    model.dataChanged.connect(lambda a, b: changed.append((a.row(), b.row())))
+    #the refresh only has the cheap columns, 11 exec'd so its icon has to go
+    assert model.set_processes(_procs(10, 11, names={11: "sh"})) == [11]
+    assert changed == [(1, 1)]
+
+    a, b = model.process(0), model.process(1)
+    assert (a.cpu, a.mem, a.daemon, a.exe, a.icon) == (5.0, 100.0, True, "/usr/bin/a", "a")
+    assert (b.name, b.icon) == ("sh", None)
+    assert model.set_processes(_procs(10, 11, names={11: "sh"})) == []
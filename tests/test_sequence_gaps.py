@@ -0,0 +1,48 @@
+import queue
+
+import numpy as np
+
+from anomaly_detector import AnomalyDetector, AnomalyWorker
+
+empty_args = np.zeros((0, 6), dtype=np.uint64)
+no_ids = np.zeros(0, dtype=np.int64)
+
+
+def _learned(det, pid):
+    return det.processes[pid]["sequence"].learned
+
+
+def test_no_transition_across_a_gap():
+    det = AnomalyDetector(exact_counts=True)
+    det.ingest_raw(1, no_ids, empty_args, np.array([1, 2, 3], dtype=np.uint16))
+    det.ingest_raw(1, no_ids, empty_args, np.array([4, 5], dtype=np.uint16), gap=True)
+    det.analyze_batch()
+    assert _learned(det, 1) == 3 #1->2, 2->3, 4->5 but not 3->4
+
+    det.ingest_raw(1, no_ids, empty_args, np.array([6], dtype=np.uint16))
+    det.analyze_batch()
+    assert _learned(det, 1) == 4 #no gap, 5->6 carries over between batches
+
+
+def test_gap_without_ids_resets_right_away():
+    det = AnomalyDetector(exact_counts=True)
+    det.ingest_raw(1, no_ids, empty_args, np.array([1, 2], dtype=np.uint16))
+    det.analyze_batch()
+    det.ingest_raw(1, no_ids, empty_args, None, gap=True)
+    det.ingest_raw(1, no_ids, empty_args, np.array([3], dtype=np.uint16))
+    det.analyze_batch()
+    assert _learned(det, 1) == 1
+
+
+def test_worker_marks_the_batch_after_a_drop():
+    w = AnomalyWorker()
+    w._inbox = queue.Queue(maxsize=1)
+    seq = np.array([1, 2], dtype=np.uint16)
+    w.submit(7, no_ids, empty_args, seq)
+    w.submit(7, no_ids, empty_args, seq) #inbox full, dropped
+    assert w.dropped == 2
+    assert w._inbox.get_nowait()[5] is False
+    w.submit(7, no_ids, empty_args, seq)
+    assert w._inbox.get_nowait()[5] is True
+    w.submit(7, no_ids, empty_args, seq)
+    assert w._inbox.get_nowait()[5] is False
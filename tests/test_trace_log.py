@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+
+from sys_tracer import evt_dtype
+from trace_log import TraceRecorder, TraceReader
+
+
+def _record(path, chunks=4, per_chunk=100):
+    rec = TraceRecorder(path, chunk_records=per_chunk)
+    rec.start()
+    for i in range(chunks):
+        b = np.zeros(per_chunk, dtype=evt_dtype)
+        b["pid"] = 1
+        b["id"] = i
+        rec.write(b, 1000.0 + i)
+    rec.close()
+
+
+def test_indexed_chunk_cut_short_is_dropped(tmp_path):
+    path = str(tmp_path / "trace.log")
+    _record(path)
+    assert len(TraceReader(path).index) == 4
+    with open(path, "r+b") as f: #crash in the middle of the last payload, the index already has its row
+        f.truncate(os.path.getsize(path) - 10)
+
+    reader = TraceReader(path)
+    assert len(reader.index) == 3
+    back = np.concatenate(list(reader.chunks()))
+    assert len(back) == 300
+    assert back["id"].tolist() == [0] * 100 + [1] * 100 + [2] * 100
+
+
+def test_missing_index_rows_are_rebuilt(tmp_path):
+    path = str(tmp_path / "trace.log")
+    _record(path)
+    idx = path + ".idx"
+    with open(idx, "r+b") as f:
+        f.truncate(os.path.getsize(idx) // 2)
+    reader = TraceReader(path)
+    assert len(reader.index) == 4
+    assert len(reader) == 400
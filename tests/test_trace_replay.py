@@ -0,0 +1,50 @@
+import pytest
+
+import numpy as np
+
+from sys_tracer import EventPipeline, evt_dtype
+from trace_log import TraceRecorder
+from trace_replay import TraceReplay
+
+
+def _record(path, batches=120, per_batch=64):
+    """read/write on a handful of fds with a few huge counts and odd transitions mixed in, 50ms apart"""
+    rng = np.random.default_rng(7)
+    rec = TraceRecorder(path)
+    rec.start()
+    for i in range(batches):
+        b = np.zeros(per_batch, dtype=evt_dtype)
+        b["pid"] = np.where(rng.random(per_batch) < 0.5, 100, 200)
+        b["id"] = np.where(np.arange(per_batch) % 2, 1, 0) #read, write, read ...
+        b["args"][:, 0] = rng.integers(3, 6, per_batch)
+        b["args"][:, 2] = rng.integers(1000, 5000, per_batch)
+        if i > 60 and i % 10 == 0:
+            b["args"][5, 2] = 1 << 40
+            b["id"][7] = 59 #execve in the middle of the read/write pattern
+        rec.write(b, 1000.0 + i * 0.05)
+    rec.close()
+
+
+def _replay(path, speed, engine="thread"):
+    r = TraceReplay(path, speed=speed, sample_every=1, engine=engine)
+    r.start()
+    assert r.wait(timeout=30)
+    found = r.anomalies.drain() #before stop, wait() already covers the analysis
+    r.stop()
+    return sorted((a.pid, a.anomaly_type, a.description, a.timestamp) for a in found)
+
+
+def test_replay_gives_the_same_anomalies_at_any_speed(tmp_path):
+    path = str(tmp_path / "trace.log")
+    _record(path)
+    fast = _replay(path, 0)
+    assert {a[1] for a in fast} == {"parameter", "sequence"} #the spikes and odd transitions do get flagged
+    assert all(1000.0 <= a[3] <= 1000.0 + 121 * 0.05 for a in fast) #stamped with trace time
+    assert _replay(path, 2.0) == fast
+    assert _replay(path, 0) == fast
+    assert _replay(path, 0, engine="process") == fast
+
+
+def test_event_pipeline_is_abstract():
+    with pytest.raises(TypeError):
+        EventPipeline(1)
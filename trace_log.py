@@ -0,0 +1,261 @@
+import os
+import time
+import zlib
+import queue
+import threading
+import numpy as np
+
+"""
+append only binary trace logs
+a recording is every raw event (pid, syscall id, 6 args, timestamp) as fixed size records,
+written in chunks by a background thread so the poll loop only pays for a copy
+
+<path>        file header, then chunks: chunk header + records (zlib compressed if flagged)
+<path>.idx    one row per chunk (offset, count, flags, first/last timestamp)
+the index is just a shortcut for seeking by time, if its missing or behind (crash mid write)
+the reader rebuilds it from the chunk headers
+
+a recording holds what reached userspace: events after the capture filter (categories turned off,
+sample rate, untracked pids), it is not a full trace of the process
+"""
+
+trace_version = 1
+trace_chunk_records = 65536 # records per chunk (4mb raw), also the most the writer holds before writing
+trace_flush_interval = 1.0 # seconds, partial chunks get written at least this often
+trace_queue_batches = 1024 # batches waiting for the writer before new ones get dropped
+
+CHUNK_ZLIB = 1
+
+_magic = b"SYSMONTR"
+_chunk_magic = b"CHNK"
+
+record_dtype = np.dtype([
+    ("ts", "<f8"),
+    ("pid", "<u4"),
+    ("id", "<u4"),
+    ("args", "<u8", (6,)),
+]) #64 bytes, no padding
+
+_header_dtype = np.dtype([("magic", "S8"), ("version", "<u4"), ("record_size", "<u4"), ("created", "<f8")])
+_chunk_dtype = np.dtype([
+    ("magic", "S4"),
+    ("flags", "<u4"),
+    ("count", "<u4"),
+    ("pad", "<u4"),
+    ("size", "<u8"), #payload bytes as stored
+    ("t_first", "<f8"),
+    ("t_last", "<f8"),
+])
+index_dtype = np.dtype([
+    ("offset", "<u8"), #of the chunk header
+    ("count", "<u4"),
+    ("flags", "<u4"),
+    ("t_first", "<f8"),
+    ("t_last", "<f8"),
+])
+
+
+class TraceRecorder:
+    """
+    streams decoded batches to a trace log on its own thread
+    write() just copies the batch into a queue, chunking, compression and file io all happen on the writer
+    if the writer cant keep up batches are dropped (and counted) instead of stalling the tracer
+    """
+
+    def __init__(self, path, compress=False, chunk_records=trace_chunk_records, flush_interval=trace_flush_interval):
+        self.path = path
+        self.compress = compress
+        self.chunk_records = chunk_records
+        self.flush_interval = flush_interval
+
+        self.written = 0 #records on disk
+        self.dropped = 0 #records the writer didnt get to
+        self.running = False
+        self._queue = queue.Queue(maxsize=trace_queue_batches)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._file = None
+        self._index = None
+
+    def start(self):
+        if self.running:
+            return
+        self._file = open(self.path, "wb")
+        self._index = open(self.path + ".idx", "wb")
+        header = np.array([(_magic, trace_version, record_dtype.itemsize, time.time())], dtype=_header_dtype)
+        self._file.write(header.tobytes())
+        self.running = True
+        self._thread.start()
+
+    def write(self, batch, ts: float):
+        """queue a decoded batch (evt_dtype records, may be a view into a reused buffer) stamped with ts"""
+        if not self.running or not len(batch):
+            return
+        try:
+            self._queue.put_nowait((batch.copy(), ts))
+        except queue.Full:
+            self.dropped += len(batch)
+
+    def close(self):
+        """write whatever is still queued and close the files"""
+        if not self.running:
+            return
+        self.running = False
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._index.close()
+
+    def _run(self):
+        pending = []
+        n = 0
+        last = time.time()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                pending.append(item)
+                n += len(item[0])
+
+            now = time.time()
+            if n >= self.chunk_records or (pending and now - last >= self.flush_interval):
+                self._flush(pending, n)
+                pending = []
+                n = 0
+                last = now
+        self._flush(pending, n)
+
+    def _flush(self, pending, n):
+        if not n:
+            return
+        try:
+            rec = np.empty(n, dtype=record_dtype)
+            i = 0
+            for batch, ts in pending:
+                j = i + len(batch)
+                rec["ts"][i:j] = ts
+                rec["pid"][i:j] = batch["pid"]
+                rec["id"][i:j] = batch["id"]
+                rec["args"][i:j] = batch["args"]
+                i = j
+            for start in range(0, n, self.chunk_records):
+                self._write_chunk(rec[start:start + self.chunk_records])
+            self._file.flush()
+            self._index.flush()
+        except Exception as e:
+            print(f"[trace log error] {e}")
+
+    def _write_chunk(self, rec):
+        payload = rec.tobytes()
+        flags = 0
+        if self.compress:
+            payload = zlib.compress(payload, 1) #level 1, most of the win for a fraction of the cpu
+            flags |= CHUNK_ZLIB
+
+        t_first, t_last = float(rec["ts"][0]), float(rec["ts"][-1])
+        offset = self._file.tell()
+        head = np.array([(_chunk_magic, flags, len(rec), 0, len(payload), t_first, t_last)], dtype=_chunk_dtype)
+        self._file.write(head.tobytes())
+        self._file.write(payload)
+        #index row only after the chunk itself, so the index never points past the data
+        self._index.write(np.array([(offset, len(rec), flags, t_first, t_last)], dtype=index_dtype).tobytes())
+        self.written += len(rec)
+
+
+class TraceReader:
+    """
+    reads a trace log back, chunk by chunk
+    chunks(t0, t1) only touches chunks whose time range overlaps, using the index
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read(_header_dtype.itemsize)
+        if len(raw) < _header_dtype.itemsize:
+            raise ValueError(f"{path}: not a trace log")
+        header = np.frombuffer(raw, dtype=_header_dtype)[0]
+        if header["magic"] != _magic or header["record_size"] != record_dtype.itemsize:
+            raise ValueError(f"{path}: not a trace log")
+        if header["version"] != trace_version:
+            raise ValueError(f"{path}: trace log version {header['version']}, expected {trace_version}")
+        self.created = float(header["created"])
+        self.index = self._load_index()
+
+    def _load_index(self):
+        size = os.path.getsize(self.path)
+        try:
+            idx = np.fromfile(self.path + ".idx", dtype=index_dtype)
+        except (OSError, ValueError):
+            idx = np.zeros(0, dtype=index_dtype)
+
+        #keep rows up to the first one whose chunk isnt all there (header and payload inside the file),
+        #then pick up any chunks the index is missing from where the good ones end
+        start = _header_dtype.itemsize
+        good = 0
+        with open(self.path, "rb") as f:
+            for row in idx:
+                offset = int(row["offset"])
+                if offset != start or offset + _chunk_dtype.itemsize > size:
+                    break
+                f.seek(offset)
+                head = np.frombuffer(f.read(_chunk_dtype.itemsize), dtype=_chunk_dtype)[0]
+                end = offset + _chunk_dtype.itemsize + int(head["size"])
+                if head["magic"] != _chunk_magic or end > size:
+                    break
+                good += 1
+                start = end
+        return np.concatenate((idx[:good], self._scan(start, size)))
+
+    def _scan(self, offset, size):
+        """walk chunk headers from offset, stops at the first incomplete chunk"""
+        rows = []
+        with open(self.path, "rb") as f:
+            while offset + _chunk_dtype.itemsize <= size:
+                f.seek(offset)
+                head = np.frombuffer(f.read(_chunk_dtype.itemsize), dtype=_chunk_dtype)[0]
+                end = offset + _chunk_dtype.itemsize + int(head["size"])
+                if head["magic"] != _chunk_magic or end > size:
+                    break
+                rows.append((offset, head["count"], head["flags"], head["t_first"], head["t_last"]))
+                offset = end
+        return np.array(rows, dtype=index_dtype)
+
+    def __len__(self):
+        return int(self.index["count"].sum())
+
+    def time_range(self):
+        """(first, last) timestamp in the log, None if its empty"""
+        if not len(self.index):
+            return None
+        return float(self.index["t_first"].min()), float(self.index["t_last"].max())
+
+    def chunks(self, t0=None, t1=None):
+        """yield record arrays in file order, trimmed to t0 <= ts <= t1 when given"""
+        sel = np.ones(len(self.index), dtype=bool)
+        if t0 is not None:
+            sel &= self.index["t_last"] >= t0
+        if t1 is not None:
+            sel &= self.index["t_first"] <= t1
+
+        with open(self.path, "rb") as f:
+            for row in self.index[sel]:
+                f.seek(int(row["offset"]))
+                head = np.frombuffer(f.read(_chunk_dtype.itemsize), dtype=_chunk_dtype)[0]
+                payload = f.read(int(head["size"]))
+                if head["flags"] & CHUNK_ZLIB:
+                    payload = zlib.decompress(payload)
+                rec = np.frombuffer(payload, dtype=record_dtype, count=int(head["count"]))
+
+                if t0 is not None or t1 is not None:
+                    keep = np.ones(len(rec), dtype=bool)
+                    if t0 is not None:
+                        keep &= rec["ts"] >= t0
+                    if t1 is not None:
+                        keep &= rec["ts"] <= t1
+                    rec = rec[keep]
+                if len(rec):
+                    yield rec
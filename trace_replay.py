@@ -0,0 +1,106 @@
+import time
+import threading
+import numpy as np
+from syscall_helpers import max_syscalls
+from sys_tracer import EventPipeline
+from trace_log import TraceReader
+
+"""
+plays trace logs (trace_log.py) back through the same userspace pipeline SysTracer uses
+no root, bcc or kernel needed, so the detector / ui / categorization can be run and measured anywhere
+"""
+
+
+class TraceReplay(EventPipeline):
+    """
+    replay source with the SysTracer interface (events, anomalies, start/stop, get_anomaly_detector,
+    set_filter ...), the ui and benchmarks cant tell the difference
+
+    events go out in the batches they were recorded in (a batch shares one timestamp)
+    category filters and sampling are done here in numpy since theres no kernel to do them
+
+    speed: 1.0 real time, 4.0 four times faster, 0 or None as fast as possible
+    detection runs on the trace timestamps (stream_clock) and nothing is dropped on the way to the worker,
+    so the same log gives the same anomalies at any speed, speed only changes how long it takes
+    pid: only replay this pid, None replays every pid in the log (tracked as they show up)
+    loop: start over at the end instead of finishing
+    profiles are off, a replay should give the same results every time not depend on whats in the cache
+    """
+
+    transport = "replay"
+    stream_clock = True
+    lossless = True
+
+    def __init__(self, path, speed=1.0, pid=None, sample_every=1, engine="thread", loop=False, seed=0):
+        self.reader = TraceReader(path)
+        self.speed = speed
+        self.loop = loop
+        self.all_pids = pid is None
+        self.finished = threading.Event() #set once the whole log went through (never with loop)
+        self._rng = np.random.default_rng(seed) #sampling, seeded so replays repeat
+
+        super().__init__(pid if pid is not None else 0, aggregate=False, sample_every=sample_every,
+                         engine=engine, profiles=False)
+        if self.all_pids:
+            self.untrack_pid(0)
+
+    def _batches(self):
+        """recorded batches in order, split wherever the timestamp changes"""
+        for chunk in self.reader.chunks():
+            ts = chunk["ts"]
+            cuts = np.flatnonzero(ts[1:] != ts[:-1]) + 1
+            start = 0
+            for end in cuts.tolist() + [len(chunk)]:
+                yield chunk[start:end]
+                start = end
+
+    def _feed(self, b):
+        if self.all_pids:
+            for pid in np.setdiff1d(b["pid"], self._pid_array).tolist():
+                self.track_pid(pid)
+
+        keep = self._enabled_ids[np.minimum(b["id"], max_syscalls - 1)] #what the enabled_ids map would have let through
+        if not self.all_pids:
+            keep &= np.isin(b["pid"], self._pid_array) #and tracked_pids
+        if self.sample_every > 1:
+            keep &= self._rng.random(len(b)) < 1.0 / self.sample_every
+        if not keep.all():
+            b = b[keep]
+        if len(b):
+            self._dispatch(b, float(b["ts"][0]))
+
+    def _run(self):
+        """
+        push the recorded batches through the pipeline, the gap between two batches is their
+        timestamp difference / speed (no sleeping at speed 0)
+        """
+        last_ts = None
+        while self.running:
+            prev = None
+            for b in self._batches():
+                if not self.running:
+                    return
+                ts = float(b["ts"][0])
+                if self.speed and prev is not None:
+                    wait = (ts - prev) / self.speed
+                    end = time.time() + wait
+                    while wait > 0 and self.running: #short sleeps so stop() doesnt hang on a long gap
+                        time.sleep(min(wait, 0.1))
+                        wait = end - time.time()
+                prev = last_ts = ts
+                self._feed(b)
+            if not self.loop:
+                break
+            self._seq_gaps = set(self.pids) #the end of the log doesnt lead into its start
+        if last_ts is not None and self.running:
+            #one more tick past the last batch so its events get analyzed, and wait for the worker to get there
+            self.anomaly_worker.set_clock(last_ts + self.analyze_interval)
+            self.anomaly_worker.sync()
+        self.finished.set()
+
+    def wait(self, timeout=None) -> bool:
+        """
+        block until the replay reached the end of the log and the anomaly worker analyzed all of it,
+        every anomaly is on self.anomalies by then (unless the worker took longer than AnomalyWorker.sync waits)
+        """
+        return self.finished.wait(timeout)